@@ -1,21 +1,72 @@
 import sys, os
-import sqlite3
+from collections import deque
 from datetime import datetime
-import requests
-import pyqtgraph as pg
 import time
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                               QHBoxLayout, QPushButton, QLabel, QTabWidget)
-from PySide6.QtCore import QTimer, Qt
+                               QHBoxLayout, QPushButton, QLabel, QTabWidget, QGridLayout, QScrollArea)
+from PySide6.QtCore import QTimer, Qt, QObject, Signal
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveRate
+from common.devices import DevicePoller, device_hosts
+from common.metrics import StreamStats
+from common.uistate import LabelState
+
 # Load environment variables from .env file
 load_dotenv()
 
-class TimeAxisItem(pg.AxisItem):
-    def tickStrings(self, values, scale, spacing):
-        # Convert timestamp to human-readable time format
-        return [datetime.fromtimestamp(value).strftime('%H:%M:%S') for value in values]
+# Style of the value labels; the text colour shows their threshold state
+LABEL_STYLE = """
+    font-size: 24px;
+    padding: 20px;
+    border: 2px solid #444;
+    border-radius: 10px;
+    background-color: #f0f0f0;
+"""
+ERROR_STYLE = """
+    font-size: 24px;
+    padding: 20px;
+    border: 2px solid #ff0000;
+    border-radius: 10px;
+    background-color: #ffe0e0;
+"""
+LABEL_COLORS = {
+    'temperature': {'normal': '#000000', 'highlight': '#ff0000', 'error': '#ff0000'},
+    'humidity': {'normal': '#000000', 'highlight': '#0000ff', 'error': '#ff0000'},
+    'pressure': {'normal': '#000000', 'highlight': '#00ff00', 'error': '#ff0000'},
+}
+
+# Seconds between polls of a device while its readings move, when steady and after errors; the
+# fastest rate matches the server's default TPH_REFRESH_INTERVAL
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 10.0
+ERROR_POLL_INTERVAL = 30.0
+# Seconds the fastest rate is kept after a reading moved, and of steady readings per halving
+ACTIVE_HOLD = 60.0
+STEADY_HALVING = 10.0
+# Change between consecutive readings that counts as movement
+ACTIVITY_STEPS = {'temperature': 0.3, 'humidity': 1.0, 'pressure': 0.3}
+# Milliseconds between checks for devices due to be polled
+POLL_TICK = 250
+# Milliseconds between database commits; readings of every device are written in one transaction
+DB_FLUSH_INTERVAL = 5000
+
+def create_time_axis():
+    # pyqtgraph is the slowest import of the client, so it is loaded with the graphs
+    import pyqtgraph as pg
+
+    class TimeAxisItem(pg.AxisItem):
+        def tickStrings(self, values, scale, spacing):
+            # Convert timestamp to human-readable time format
+            return [datetime.fromtimestamp(value).strftime('%H:%M:%S') for value in values]
+
+    return TimeAxisItem(orientation='bottom')
+
+
+class FetchSignals(QObject):
+    # Delivers poller results from worker threads to the GUI thread
+    result = Signal(object)
 
 
 class EnvironmentMonitor(QMainWindow):
@@ -24,8 +75,12 @@ class EnvironmentMonitor(QMainWindow):
         self.setWindowTitle("Environment Parameters Monitoring")
         self.setGeometry(100, 100, 1200, 800)
 
-        # Initialize database
-        self.init_database()
+        # Raspberry Pis to monitor, from RASPBERRY_PI_LOCAL_IP
+        self.devices = device_hosts()
+
+        # Database is opened with the first reading; rows wait in pending_rows until the next flush
+        self.db = None
+        self.pending_rows = []
 
         # Create main widget and layout
         main_widget = QWidget()
@@ -40,86 +95,130 @@ class EnvironmentMonitor(QMainWindow):
         self.real_time_tab = QWidget()
         self.tabs.addTab(self.real_time_tab, "Current Values")
 
-        # Create graphs tab
+        # Create graphs tab, filled in when it is first opened
         self.graphs_tab = QWidget()
         self.tabs.addTab(self.graphs_tab, "Graphs")
+        self.tabs.currentChanged.connect(self.tab_changed)
 
         self.setup_real_time_tab()
-        self.setup_graphs_tab()
 
-        # Setup update timer
+        # Initialize data storage, keeping only the last 50 points per device
+        self.curves = None
+        self.history = {
+            device: {name: deque(maxlen=50) for name in ('timestamps', 'temperature', 'humidity', 'pressure')}
+            for device in self.devices
+        }
+
+        # Latency and throughput statistics overlay, per device
+        self.stats = {device: StreamStats() for device in self.devices}
+        # Every device is polled faster while its readings move, and slower when steady or unreachable
+        self.rates = {device: AdaptiveRate(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL, 1.0, 0.5, ACTIVE_HOLD,
+                                           STEADY_HALVING, ERROR_POLL_INTERVAL)
+                      for device in self.devices}
+        self.requested = {device: float('-inf') for device in self.devices}
+        self.stats_label = QLabel("Stats: waiting for data...")
+        self.stats_label.setStyleSheet("font-family: monospace; color: #555")
+        layout.addWidget(self.stats_label)
+        self.stats_text = LabelState(self.stats_label)
+
+        self.poller = None
+        self.started = False
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.started:
+            # Connect after the first frame, so the window appears immediately
+            self.started = True
+            QTimer.singleShot(0, self.start)
+
+    def start(self):
+        # Fetch all devices concurrently; results arrive through a queued signal
+        self.fetch_signals = FetchSignals()
+        self.fetch_signals.result.connect(self.handle_result)
+        self.poller = DevicePoller(self.devices, 5001, '/data', timeout=1.5,
+                                   callback=self.fetch_signals.result.emit, backfill=True, catch_up=True)
+
+        # Setup update timer; devices are requested when their adaptive interval has passed
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_data)
-        self.timer.start(2000)  # Update every 2 seconds
+        self.timer.start(POLL_TICK)
+        self.update_data()
+
+        # Commit readings of all devices together, so a larger fleet does not mean more commits
+        self.db_timer = QTimer()
+        self.db_timer.timeout.connect(self.flush_database)
+        self.db_timer.start(DB_FLUSH_INTERVAL)
+
+    def tab_changed(self, index):
+        if self.tabs.widget(index) is self.graphs_tab and self.curves is None:
+            self.setup_graphs_tab()
 
     def init_database(self):
-        # Initialize SQLite database and create readings table
-        conn = sqlite3.connect('environment_data.db')
-        c = conn.cursor()
+        import sqlite3
+
+        # Initialize SQLite database and create readings table keyed by device
+        self.db = sqlite3.connect('environment_data.db')
+        c = self.db.cursor()
         # Drop existing table and create new one
         c.execute("DROP TABLE IF EXISTS readings")
         c.execute('''CREATE TABLE readings
-                    (timestamp TEXT, temperature REAL, humidity REAL, pressure REAL)''')
-        conn.commit()
-        conn.close()
+                    (device TEXT, timestamp TEXT, temperature REAL, humidity REAL, pressure REAL)''')
+        self.db.commit()
+
+    def flush_database(self):
+        if not self.pending_rows:
+            return
+        if self.db is None:
+            self.init_database()
+        self.db.executemany("INSERT INTO readings VALUES (?,?,?,?,?)", self.pending_rows)
+        self.db.commit()
+        self.pending_rows = []
 
     def setup_real_time_tab(self):
         # Create layout for real-time data display
         layout = QVBoxLayout(self.real_time_tab)
 
-        # Create containers for each measurement
-        temp_container = QWidget()
-        humidity_container = QWidget()
-        pressure_container = QWidget()
-
-        # Set up layouts for containers
-        temp_layout = QVBoxLayout(temp_container)
-        humidity_layout = QVBoxLayout(humidity_container)
-        pressure_layout = QVBoxLayout(pressure_container)
-
-        # Create labels for values with styling
-        self.temp_label = QLabel("Temperature: --°C")
-        self.humidity_label = QLabel("Humidity: --%")
-        self.pressure_label = QLabel("Pressure: -- mbar")
-
-        # Style labels
-        style = """
-            QLabel {
-                font-size: 24px;
-                padding: 20px;
-                border: 2px solid #444;
-                border-radius: 10px;
-                background-color: #f0f0f0;
+        # One row per device with temperature, humidity and pressure labels.
+        # A single device keeps the measurements stacked vertically.
+        grid_widget = QWidget()
+        grid = QGridLayout(grid_widget)
+        grid.setSpacing(20)
+        self.value_labels = {}
+        single = len(self.devices) == 1
+        for row, device in enumerate(self.devices):
+            labels = {
+                'temperature': QLabel("Temperature: --°C"),
+                'humidity': QLabel("Humidity: --%"),
+                'pressure': QLabel("Pressure: -- mbar"),
+            }
+            if not single:
+                grid.addWidget(QLabel(device), row, 0)
+            for column, label in enumerate(labels.values()):
+                label.setAlignment(Qt.AlignCenter)
+                grid.addWidget(label, *((column, 0) if single else (row, column + 1)))
+            # Styles of every state are built once; updates only switch states
+            self.value_labels[device] = {
+                name: LabelState(label, LABEL_STYLE, LABEL_COLORS[name], {'error': ERROR_STYLE}, 'normal')
+                for name, label in labels.items()
             }
-        """
-
-        for label in [self.temp_label, self.humidity_label, self.pressure_label]:
-            label.setAlignment(Qt.AlignCenter)
-            label.setStyleSheet(style)
-
-        # Add labels to their respective layouts
-        temp_layout.addWidget(self.temp_label)
-        humidity_layout.addWidget(self.humidity_label)
-        pressure_layout.addWidget(self.pressure_label)
-
-        # Add containers to main layout with spacing
-        layout.addWidget(temp_container)
-        layout.addSpacing(20)
-        layout.addWidget(humidity_container)
-        layout.addSpacing(20)
-        layout.addWidget(pressure_container)
 
-        # Add stretch to center widgets vertically
-        layout.addStretch()
+        # Scroll when monitoring more devices than fit in the window
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setFrameShape(QScrollArea.NoFrame)
+        scroll.setWidget(grid_widget)
+        layout.addWidget(scroll)
 
     def setup_graphs_tab(self):
+        import pyqtgraph as pg
+
         # Create graphs tab with custom time axis
         layout = QVBoxLayout(self.graphs_tab)
 
         # Create plot widgets with custom time axis
-        self.temp_plot = pg.PlotWidget(axisItems={'bottom': TimeAxisItem(orientation='bottom')})
-        self.humidity_plot = pg.PlotWidget(axisItems={'bottom': TimeAxisItem(orientation='bottom')})
-        self.pressure_plot = pg.PlotWidget(axisItems={'bottom': TimeAxisItem(orientation='bottom')})
+        self.temp_plot = pg.PlotWidget(axisItems={'bottom': create_time_axis()})
+        self.humidity_plot = pg.PlotWidget(axisItems={'bottom': create_time_axis()})
+        self.pressure_plot = pg.PlotWidget(axisItems={'bottom': create_time_axis()})
 
         # Set titles and labels
         self.temp_plot.setTitle("Temperature", color='w', size='20pt')
@@ -137,107 +236,121 @@ class EnvironmentMonitor(QMainWindow):
             plot.setBackground('black')
             plot.getAxis('left').setTextPen('w')
             plot.getAxis('bottom').setTextPen('w')
+            if len(self.devices) > 1:
+                plot.addLegend()
             layout.addWidget(plot)
 
-        # Create plot curves with thicker lines
-        self.temp_curve = self.temp_plot.plot(pen=pg.mkPen('r', width=2))
-        self.humidity_curve = self.humidity_plot.plot(pen=pg.mkPen('b', width=2))
-        self.pressure_curve = self.pressure_plot.plot(pen=pg.mkPen('g', width=2))
+        # Create plot curves with thicker lines, overlaid per device
+        self.curves = {}
+        for index, device in enumerate(self.devices):
+            if len(self.devices) == 1:
+                colors = ('r', 'b', 'g')
+            else:
+                colors = (pg.intColor(index, hues=len(self.devices)),) * 3
+            self.curves[device] = {
+                'temperature': self.temp_plot.plot(pen=pg.mkPen(colors[0], width=2), name=device),
+                'humidity': self.humidity_plot.plot(pen=pg.mkPen(colors[1], width=2), name=device),
+                'pressure': self.pressure_plot.plot(pen=pg.mkPen(colors[2], width=2), name=device),
+            }
+            self.update_curves(device)
 
-        # Initialize data storage lists
-        self.timestamps = []
-        self.temperatures = []
-        self.humidities = []
-        self.pressures = []
+    def update_curves(self, device):
+        if self.curves is None:
+            return
+        history = self.history[device]
+        for name, curve in self.curves[device].items():
+            curve.setData(list(history['timestamps']), list(history[name]))
 
     def update_data(self):
+        # Start a request on every due device that is not still answering the last one
+        now = time.monotonic()
+        due = [device for device in self.devices if now - self.requested[device] >= self.rates[device].interval]
+        if due:
+            self.poller.request(due)
+            for device in due:
+                self.requested[device] = now
+
+    def observe_activity(self, device, readings):
+        # Largest change between consecutive readings, in ACTIVITY_STEPS
+        history = self.history[device]
+        previous = {name: history[name][-1] for name in ACTIVITY_STEPS} if history['timestamps'] else None
+        activity = 0.0
+        for reading in readings:
+            if previous is not None:
+                activity = max(activity, *(abs(reading[name] - previous[name]) / step
+                                           for name, step in ACTIVITY_STEPS.items()))
+            previous = reading
+        self.rates[device].observe(activity)
+
+    def handle_result(self, result):
+        device = result['host']
+        labels = self.value_labels[device]
+        stats = self.stats[device]
+        self.rates[device].link(result['fetch'], result['error'] is not None)
         try:
-            # Get data from Raspberry Pi server
-            RASPBERRY_PI_IP = os.environ.get("RASPBERRY_PI_LOCAL_IP")
-            response = requests.get(f'http://{RASPBERRY_PI_IP}:5001/data')
-            data = response.json()
+            if result['error'] is not None:
+                raise result['error']
+            data = result['data']
+            if not stats.add_sample(data.get('seq'), result['fetch'], result['parse']):
+                return
 
-            # Update labels with colors based on values
+            # Update labels with colors based on values; unchanged labels are not touched
             temp = data['temperature']
-            temp_color = '#ff0000' if temp > 30 else '#000000'
-            self.temp_label.setText(f"Temperature: {temp}°C")
-            self.temp_label.setStyleSheet(f"""
-                font-size: 24px;
-                padding: 20px;
-                border: 2px solid #444;
-                border-radius: 10px;
-                background-color: #f0f0f0;
-                color: {temp_color};
-            """)
+            labels['temperature'].set(f"Temperature: {temp}°C", 'highlight' if temp > 30 else 'normal')
 
             humidity = data['humidity']
-            humidity_color = '#0000ff' if humidity > 60 else '#000000'
-            self.humidity_label.setText(f"Humidity: {humidity}%")
-            self.humidity_label.setStyleSheet(f"""
-                font-size: 24px;
-                padding: 20px;
-                border: 2px solid #444;
-                border-radius: 10px;
-                background-color: #f0f0f0;
-                color: {humidity_color};
-            """)
+            labels['humidity'].set(f"Humidity: {humidity}%", 'highlight' if humidity > 60 else 'normal')
 
             pressure = data['pressure']
-            pressure_color = '#00ff00' if 980 <= pressure <= 1020 else '#000000'
-            self.pressure_label.setText(f"Pressure: {pressure} mbar")
-            self.pressure_label.setStyleSheet(f"""
-                font-size: 24px;
-                padding: 20px;
-                border: 2px solid #444;
-                border-radius: 10px;
-                background-color: #f0f0f0;
-                color: {pressure_color};
-            """)
-
-            # Save to database
-            conn = sqlite3.connect('environment_data.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO readings VALUES (?,?,?,?)",
-                      (data['timestamp'], temp, humidity, pressure))
-            conn.commit()
-            conn.close()
-
-            # Update graphs
-            current_time = time.time()
-            self.timestamps.append(current_time)
-            self.temperatures.append(temp)
-            self.humidities.append(humidity)
-            self.pressures.append(pressure)
-
-            # Keep only last 50 points
-            if len(self.timestamps) > 50:
-                self.timestamps = self.timestamps[-50:]
-                self.temperatures = self.temperatures[-50:]
-                self.humidities = self.humidities[-50:]
-                self.pressures = self.pressures[-50:]
+            labels['pressure'].set(f"Pressure: {pressure} mbar", 'highlight' if 980 <= pressure <= 1020 else 'normal')
+
+            # Readings missed during a disconnect, then the current one, in order
+            readings = result['backfill'] + [data]
+            stats.add_recovered(len(result['backfill']))
+
+            # Queue for the next database flush
+            self.pending_rows.extend((device, reading['timestamp'], reading['temperature'], reading['humidity'],
+                                      reading['pressure']) for reading in readings)
+
+            self.observe_activity(device, readings)
+
+            # Update graphs, placing each reading at its acquisition time
+            history = self.history[device]
+            now = time.time()
+            for reading in readings:
+                history['timestamps'].append(now - reading.get('age', 0.0))
+                history['temperature'].append(reading['temperature'])
+                history['humidity'].append(reading['humidity'])
+                history['pressure'].append(reading['pressure'])
 
             # Update plot curves
-            self.temp_curve.setData(self.timestamps, self.temperatures)
-            self.humidity_curve.setData(self.timestamps, self.humidities)
-            self.pressure_curve.setData(self.timestamps, self.pressures)
+            self.update_curves(device)
+
+            stats.add_latency(data.get('age', 0.0), result['fetch'], time.monotonic() - result['received'])
+            self.update_stats()
 
         except Exception as e:
-            print(f"Error updating data: {e}")
+            print(f"Error updating data from {device}: {e}")
             # Update labels to show error state
-            error_style = """
-                font-size: 24px;
-                padding: 20px;
-                border: 2px solid #ff0000;
-                border-radius: 10px;
-                background-color: #ffe0e0;
-                color: #ff0000;
-            """
-            self.temp_label.setStyleSheet(error_style)
-            self.humidity_label.setStyleSheet(error_style)
-            self.pressure_label.setStyleSheet(error_style)
-            self.temp_label.setText("Connection Error")
-            self.humidity_label.setText("Connection Error")
-            self.pressure_label.setText("Connection Error")
+            for label in labels.values():
+                label.set("Connection Error", 'error')
+
+    def update_stats(self):
+        if len(self.devices) == 1:
+            device = self.devices[0]
+            self.stats_text.set(f"{self.stats[device].overlay_text()} | {self.rates[device].overlay_text()}")
+        else:
+            self.stats_text.set("\n".join(f"{device}: {stats.overlay_text()} | {self.rates[device].overlay_text()}"
+                                               for device, stats in self.stats.items()))
+
+    def closeEvent(self, event):
+        if self.poller is not None:
+            self.db_timer.stop()
+            self.poller.shutdown()
+        self.flush_database()
+        if self.db is not None:
+            self.db.close()
+        super().closeEvent(event)
 
 
 def main():
@@ -254,4 +367,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,16 @@
-from sense_hat import SenseHat
 from flask import Flask, jsonify
-import time, sys
+import atexit
+import time, sys, os
 from datetime import datetime
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.compensation import TemperatureCompensator
+from common.metrics import ServerMetrics, register_metrics
+from common.sampler import Sampler
+from common.sensors import THERMAL_ZONE, cpu_thermometer, create_sense
+from common.serving import register_history, register_stream, run_server
+
 app = Flask(__name__)
 
 # Disable Flask logging
@@ -12,21 +19,87 @@ log = logging.getLogger('werkzeug')
 log.disabled = True
 
 # Initialize SenseHat
-sense = SenseHat()
+sense = create_sense()
+metrics = ServerMetrics()
+register_metrics(app, metrics)
 
 
-def get_readings():
-    # Collect sensor readings and format the data
-    temp = round(sense.get_temperature_from_humidity(), 1)
+# Seconds between background sensor reads, and the oldest cached reading /data may serve
+REFRESH_INTERVAL = float(os.environ.get('TPH_REFRESH_INTERVAL', 1.0))
+MAX_AGE = float(os.environ.get('TPH_MAX_AGE', 5.0))
+# Readings kept for clients catching up after a disconnect
+HISTORY_SIZE = int(os.environ.get('TPH_HISTORY_SIZE', 3600))
+# Also publish the readings to a shared memory ring for other processes on the Pi, such as the LED display
+SHARED_RING = os.environ.get('SENSEHAT_SHARED_RINGS', '0') not in ('', '0')
+
+# Optional CPU heat compensation of the temperature, served as temperature_compensated
+COMPENSATE = os.environ.get('TPH_COMPENSATE', '0') not in ('', '0')
+read_cpu_temperature = None
+compensator = None
+if COMPENSATE:
+    read_cpu_temperature = cpu_thermometer(sense, os.environ.get('TPH_THERMAL_ZONE', THERMAL_ZONE))
+    if read_cpu_temperature is None:
+        print("CPU thermal zone not found, serving uncompensated temperature only")
+    else:
+        compensator = TemperatureCompensator(float(os.environ.get('TPH_COMPENSATION_FACTOR', 1.5)),
+                                             float(os.environ.get('TPH_COMPENSATION_OFFSET', 0.0)),
+                                             float(os.environ.get('TPH_COMPENSATION_TAU', 10.0)))
+
+
+def read_sensors():
+    # Sensor values and formatted acquisition time of one reading
+    raw_temp = sense.get_temperature_from_humidity()
+    temp = round(raw_temp, 1)
     humidity = round(sense.get_humidity(), 1)
     pressure = round(sense.get_pressure(), 1)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return {
+    readings = {
         'timestamp': timestamp,
         'temperature': temp,
         'humidity': humidity,
         'pressure': pressure
     }
+    if compensator is not None:
+        # The sampler serialises reads, so the filter sees readings in order
+        pressure_temp = sense.get_temperature_from_pressure()
+        cpu_temp = read_cpu_temperature()
+        compensated = compensator.update(time.monotonic(), raw_temp, pressure_temp, cpu_temp)
+        readings.update({
+            'temperature_compensated': round(compensated, 1),
+            'temperature_pressure': round(pressure_temp, 1),
+            'cpu_temperature': round(cpu_temp, 1),
+        })
+    return readings
+
+
+publish_readings = None
+if SHARED_RING:
+    from common.shm_ring import publish_sensor_ring
+    ring = publish_sensor_ring('tph', HISTORY_SIZE)
+    atexit.register(ring.unlink)
+
+    def publish_readings(sample):
+        readings, seq, acquired = sample
+        # Readers get the best temperature estimate available
+        temperature = readings.get('temperature_compensated', readings['temperature'])
+        ring.append([acquired, temperature, readings['humidity'], readings['pressure'], seq])
+
+
+# The sensors only change on a scale of seconds, so they are read in the
+# background at their native rate and requests are served from memory
+sampler = Sampler(metrics, read_sensors, REFRESH_INTERVAL, MAX_AGE, HISTORY_SIZE,
+                  on_sample=publish_readings).start()
+metrics.queue_depth = sampler.queue_depth
+
+
+def format_readings(sample):
+    # Reading with its sequence number and age in seconds
+    readings, seq, acquired = sample
+    return {**readings, **metrics.stamp(seq, acquired)}
+
+
+def get_readings():
+    return format_readings(sampler.latest())
 
 
 @app.route('/data')
@@ -35,8 +108,10 @@ def get_data():
     return jsonify(get_readings())
 
 
+register_stream(app, get_readings, default_interval=2.0)
+register_history(app, sampler, format_readings)
+
+
 if __name__ == '__main__':
-    # Run server without displaying banner logs
-    cli = sys.modules['flask.cli']
-    cli.show_server_banner = lambda *x: None
-    app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
+    # Run Flask server on all network interfaces, port 5001
+    run_server(app, 5001)
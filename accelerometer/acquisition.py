@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import multiprocessing
+from threading import Lock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveRate
+from common.devices import DevicePoller
+from common.metrics import StreamStats
+from common.seismic import INTENSITY_LEVELS, intensity_level, pga
+
+# Columns of every row the worker writes to a device's shared ring
+FIELDS = ['t', 'x', 'y', 'z', 'pga', 'level', 'seq']
+# Rows kept per device, about 7 minutes at 10 samples per second
+RING_CAPACITY = 4096
+# Seconds between polls of a device during seismic activity, when quiet and after errors; the
+# fastest rate matches the server's default ACCEL_SAMPLE_INTERVAL
+MIN_POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 1.0
+ERROR_POLL_INTERVAL = 5.0
+# Seconds the fastest rate is kept after the PGA reached the first intensity level, and of quiet per halving
+ACTIVE_HOLD = 30.0
+QUIET_HALVING = 5.0
+# Seconds between status messages to the GUI
+STATUS_INTERVAL = 1.0
+
+
+def analyse(samples):
+    """
+    Returns the ring rows of a list of acceleration samples: their values
+    with the PGA and the index of their INTENSITY_LEVELS entry, computed
+    for the whole batch at once
+    """
+    import numpy as np
+
+    rows = np.empty((len(samples), len(FIELDS)))
+    for column, name in enumerate(('timestamp', 'x', 'y', 'z')):
+        rows[:, column] = [sample[name] for sample in samples]
+    rows[:, 6] = [sample.get('seq', -1) for sample in samples]
+    rows[:, 4] = pga(rows[:, 1], rows[:, 2], rows[:, 3])
+    rows[:, 5] = intensity_level(rows[:, 4])
+    return rows
+
+
+def run_acquisition(devices, ring_names, stop_event, status_queue):
+    """
+    Worker process: poll the devices, analyse the samples and append them
+    to the shared ring of their device until stop_event is set
+
+    Every device is polled at its own adaptive rate: the fastest while its
+    PGA exceeds the no-activity level, backing off while it stays near
+    rest or while its link is slow or failing. Every poll also fetches the
+    samples the server took since the previous one, so the PGA of every
+    sample is analysed at any rate.
+
+    Connection state and statistics text are sent to the GUI as
+    {'connected': {device: bool}, 'stats': {device: str}} on status_queue,
+    every STATUS_INTERVAL seconds and whenever a connection changes.
+
+    Args:
+        devices (list): device addresses
+        ring_names (dict): {device: name of its SharedRing}
+        stop_event (Event): set by the GUI to stop the worker
+        status_queue (Queue): receives the status messages
+    """
+    from common.shm_ring import SharedRing
+
+    rings = {device: SharedRing.attach(name, FIELDS) for device, name in ring_names.items()}
+    stats = {device: StreamStats() for device in devices}
+    # Seismic trigger at the upper bound of "No Seismic Activity", back-off below half of it
+    trigger = INTENSITY_LEVELS[0][0]
+    rates = {device: AdaptiveRate(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL, trigger, trigger / 2, ACTIVE_HOLD,
+                                  QUIET_HALVING, ERROR_POLL_INTERVAL)
+             for device in devices}
+    connected = {}
+    write_lock = Lock()
+    # The GUI may exit without draining the queue
+    status_queue.cancel_join_thread()
+
+    def handle_result(result):
+        # Runs in poller threads; a ring allows a single writer at a time
+        device = result['host']
+        rates[device].link(result['fetch'], result['error'] is not None)
+        if result['error'] is not None:
+            connected[device] = False
+            return
+        data = result['data']
+        with write_lock:
+            if not stats[device].add_sample(data.get('seq'), result['fetch'], result['parse']):
+                return
+            # Samples missed during a disconnect, then the current one, in order
+            rows = analyse(result['backfill'] + [data])
+            rings[device].append(rows)
+            rates[device].observe(rows[:, 4].max())
+            stats[device].add_recovered(len(result['backfill']))
+            stats[device].add_latency(data.get('age', 0.0), result['fetch'], time.monotonic() - result['received'])
+        connected[device] = True
+
+    # Samples taken between slow polls are fetched too, so a short tremor still reaches the trigger
+    poller = DevicePoller(devices, 5003, '/get_acceleration', timeout=0.5, callback=handle_result, backfill=True,
+                          catch_up=True)
+    parent = multiprocessing.parent_process()
+    sent = None
+    last_status = 0.0
+    requested = {device: float('-inf') for device in devices}
+    try:
+        while not stop_event.is_set() and (parent is None or parent.is_alive()):
+            now = time.monotonic()
+            due = [device for device in devices if now - requested[device] >= rates[device].interval]
+            if due:
+                poller.request(due)
+                for device in due:
+                    requested[device] = now
+            state = dict(connected)
+            if state != sent or now - last_status >= STATUS_INTERVAL:
+                status_queue.put({'connected': state,
+                                  'stats': {device: f"{stats[device].overlay_text()} | {rates[device].overlay_text()}"
+                                            for device in devices}})
+                sent = state
+                last_status = now
+            # Sleep until the next device is due, or the next status message
+            next_time = min([requested[device] + rates[device].interval for device in devices]
+                            + [last_status + STATUS_INTERVAL])
+            stop_event.wait(max(0.0, next_time - time.monotonic()))
+    finally:
+        poller.shutdown(wait=True)
+        for ring in rings.values():
+            ring.close()
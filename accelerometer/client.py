@@ -1,39 +1,23 @@
 import os
 import sys
 import time
-from collections import deque
-import numpy as np
-import pyqtgraph as pg
-import requests
+import queue
 from PySide6.QtCore import QTimer, Qt
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QGroupBox,
-                               QPushButton, QFrame)
+                               QPushButton, QFrame, QComboBox)
 from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.devices import device_hosts
+from common.seismic import INTENSITY_LEVELS
+from common.uistate import LabelState
+from acquisition import FIELDS, RING_CAPACITY, run_acquisition
+
 # Load variables from .env file
 load_dotenv()
 
 
-def estimate_earthquake_intensity(pga):
-    """
-    Estimates earthquake intensity based on Peak Ground Acceleration (PGA)
-    pga: peak ground acceleration in g units
-    """
-    if pga < 0.015:
-        return "No Seismic Activity", "lightblue"
-    elif pga < 0.022:
-        return "Micro Seismic Vibrations (1-2 points)", "green"
-    elif pga < 0.05:
-        return "Weak Earthquake (3-4 points)", "yellow"
-    elif pga < 0.1:
-        return "Moderate Earthquake (5 points)", "orange"
-    elif pga < 0.2:
-        return "Very Strong Earthquake (7 points)", "red"
-    elif pga < 0.4:
-        return "Destructive Earthquake (8 points)", "darkred"
-    else:
-        return "Catastrophic Earthquake (9+ points)", "purple"
-
 
 class AccelerometerWindow(QMainWindow):
     def __init__(self):
@@ -44,6 +28,10 @@ class AccelerometerWindow(QMainWindow):
         self.setWindowTitle("Sense HAT Accelerometer Monitoring")
         self.setGeometry(100, 100, 1200, 900)
 
+        # Raspberry Pis to monitor, from RASPBERRY_PI_LOCAL_IP
+        self.devices = device_hosts()
+        self.selected = self.devices[0] if self.devices else None
+
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
@@ -70,17 +58,27 @@ class AccelerometerWindow(QMainWindow):
         self.pga_label = QLabel("Peak Ground Acceleration (PGA): 0.000 g")
         self.pga_label.setFont(QFont("Arial", 12))
         earthquake_layout.addWidget(self.pga_label)
+        self.pga = LabelState(self.pga_label)
 
         # Intensity estimation
         self.intensity_label = QLabel("Intensity: No Data")
         self.intensity_label.setFont(QFont("Arial", 12, QFont.Bold))
         earthquake_layout.addWidget(self.intensity_label)
+        # One state per intensity colour, so a new level only switches state
+        self.intensity = LabelState(self.intensity_label, colors={color: color for _, _, color in INTENSITY_LEVELS})
 
         earthquake_group.setLayout(earthquake_layout)
         main_layout.addWidget(earthquake_group)
 
-        # Graph setup
-        self.setup_plot(main_layout)
+        # Graph group; the plot itself is created once the window is shown
+        graph_group = QGroupBox("Acceleration Graph")
+        self.graph_layout = QVBoxLayout()
+        self.graph_placeholder = QLabel("Loading graph...")
+        self.graph_placeholder.setAlignment(Qt.AlignCenter)
+        self.graph_layout.addWidget(self.graph_placeholder)
+        graph_group.setLayout(self.graph_layout)
+        main_layout.addWidget(graph_group, stretch=1)
+        self.plot_widget = None
 
         # Control buttons
         control_layout = QHBoxLayout()
@@ -94,35 +92,83 @@ class AccelerometerWindow(QMainWindow):
         pause_button.clicked.connect(self.toggle_pause)
         control_layout.addWidget(pause_button)
 
+        # Device whose values and graph are shown when monitoring several
+        if len(self.devices) > 1:
+            device_selector = QComboBox()
+            device_selector.addItems(self.devices)
+            device_selector.currentTextChanged.connect(self.select_device)
+            control_layout.addWidget(device_selector)
+
         main_layout.addLayout(control_layout)
 
         # Connection status
         self.status_label = QLabel("Status: Waiting for data...")
-        self.status_label.setStyleSheet("color: orange")
         main_layout.addWidget(self.status_label)
-
-        # Using deque to limit data points
+        self.status = LabelState(self.status_label, colors={color: color for color in ('green', 'orange', 'red')},
+                                 state='orange')
+
+        # Latency and throughput statistics overlay, per device, measured by the worker
+        self.stats = {}
+        self.stats_label = QLabel("Stats: waiting for data...")
+        self.stats_label.setStyleSheet("font-family: monospace; color: gray")
+        main_layout.addWidget(self.stats_label)
+        self.stats_text = LabelState(self.stats_label)
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
+
+        # Samples live in one shared memory ring per device; the graph shows the newest
         self.max_points = 100
-        self.times = deque(maxlen=self.max_points)
-        self.x_data = deque(maxlen=self.max_points)
-        self.y_data = deque(maxlen=self.max_points)
-        self.z_data = deque(maxlen=self.max_points)
-        self.pga_data = deque(maxlen=self.max_points)
+        self.rings = {}
+        self.cleared = {device: 0 for device in self.devices}
+        self.shown = None
+        self.connected = {}
 
         self.start_time = time.time()
         self.paused = False
+        self.worker = None
+        self.started = False
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.started:
+            # Connect and build the graph after the first frame, so the window appears immediately
+            self.started = True
+            QTimer.singleShot(0, self.start)
+
+    def create_rings(self):
+        from common.shm_ring import SharedRing
+
+        self.rings = {device: SharedRing.create(FIELDS, RING_CAPACITY) for device in self.devices}
+
+    def start(self):
+        import multiprocessing
+
+        # Fetching and analysis run in a worker process, so they never hold up
+        # rendering; it writes samples to the rings and sends status on a queue
+        self.create_rings()
+        context = multiprocessing.get_context('spawn')
+        self.stop_event = context.Event()
+        self.status_queue = context.Queue()
+        self.worker = context.Process(
+            target=run_acquisition, daemon=True,
+            args=(self.devices, {device: ring.name for device, ring in self.rings.items()},
+                  self.stop_event, self.status_queue))
+        self.worker.start()
 
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_data)
         self.timer.start(100)
 
+        self.setup_plot()
+
         self.plot_timer = QTimer()
         self.plot_timer.timeout.connect(self.update_plot)
         self.plot_timer.start(200)
 
-    def setup_plot(self, main_layout):
-        graph_group = QGroupBox("Acceleration Graph")
-        graph_layout = QVBoxLayout()
+    def setup_plot(self):
+        # pyqtgraph is the slowest import of the client, so it is loaded here
+        import pyqtgraph as pg
 
         self.plot_widget = pg.PlotWidget()
         self.plot_widget.setBackground('w')
@@ -143,9 +189,9 @@ class AccelerometerWindow(QMainWindow):
         self.z_line = self.plot_widget.plot(pen=pg.mkPen(color=(0, 0, 255), width=pen_width), name='Z Axis')
         self.pga_line = self.plot_widget.plot(pen=pg.mkPen(color=(128, 0, 128), width=pen_width), name='PGA')
 
-        graph_layout.addWidget(self.plot_widget)
-        graph_group.setLayout(graph_layout)
-        main_layout.addWidget(graph_group)
+        self.graph_layout.removeWidget(self.graph_placeholder)
+        self.graph_placeholder.deleteLater()
+        self.graph_layout.addWidget(self.plot_widget)
 
     def create_value_frame(self, title, color):
         frame = QFrame()
@@ -166,78 +212,105 @@ class AccelerometerWindow(QMainWindow):
         layout.addWidget(value_label)
         frame.setLayout(layout)
 
-        return {'frame': frame, 'value_label': value_label}
+        return {'frame': frame, 'value_label': value_label, 'value': LabelState(value_label)}
 
     def toggle_pause(self, checked):
         self.paused = checked
         sender = self.sender()
         sender.setText("Continue" if checked else "Pause")
 
+    def select_device(self, device):
+        self.selected = device
+        self.shown = None
+        self.update_data()
+        self.update_plot()
+        self.update_stats()
+
     def clear_graph(self):
-        self.times.clear()
-        self.x_data.clear()
-        self.y_data.clear()
-        self.z_data.clear()
-        self.pga_data.clear()
+        # Samples already in the rings are no longer plotted
+        self.cleared = {device: ring.count for device, ring in self.rings.items()}
         self.start_time = time.time()
         self.update_plot()
 
     def update_plot(self):
-        if not self.times or self.paused:
+        if self.plot_widget is None or self.selected not in self.rings or self.paused:
             return
-
-        times_array = np.array(self.times)
-        relative_times = times_array - self.start_time
-
-        self.x_line.setData(relative_times, np.array(self.x_data))
-        self.y_line.setData(relative_times, np.array(self.y_data))
-        self.z_line.setData(relative_times, np.array(self.z_data))
-        self.pga_line.setData(relative_times, np.array(self.pga_data))
+        ring = self.rings[self.selected]
+        rows, _ = ring.since(self.cleared[self.selected], limit=self.max_points)
+
+        relative_times = rows[:, ring.column('t')] - self.start_time
+        self.x_line.setData(relative_times, rows[:, ring.column('x')])
+        self.y_line.setData(relative_times, rows[:, ring.column('y')])
+        self.z_line.setData(relative_times, rows[:, ring.column('z')])
+        self.pga_line.setData(relative_times, rows[:, ring.column('pga')])
+
+    def update_stats(self):
+        if self.selected in self.stats:
+            self.stats_text.set(self.stats[self.selected])
+
+    def update_status(self):
+        if len(self.devices) == 1:
+            connected = self.connected.get(self.selected)
+            self.status.set("Status: Connected" if connected else "Status: Connection Error",
+                            'green' if connected else 'red')
+            return
+        count = sum(self.connected.values())
+        if count == len(self.devices):
+            color = 'green'
+        else:
+            color = 'orange' if count else 'red'
+        self.status.set(f"Status: Connected to {count}/{len(self.devices)} devices", color)
+
+    def read_status(self):
+        # Connection state and statistics sent by the worker since the last tick
+        while True:
+            try:
+                status = self.status_queue.get_nowait()
+            except queue.Empty:
+                break
+            if status['connected'] != self.connected:
+                self.connected = status['connected']
+                self.update_status()
+            self.stats = status['stats']
 
     def update_data(self):
-        def calculate_pga(x, y, z):
-            # Deviation from normal state
-            x_dev = abs(x)  # deviation in X from 0
-            y_dev = abs(y)  # deviation in Y from 0
-            z_dev = abs(z - 0.978)  # deviation in Z from 1g
-
-            # Take maximum deviation as PGA
-            return max(x_dev, y_dev, z_dev)
-        if self.paused:
+        if self.worker is not None:
+            self.read_status()
+        if self.paused or self.selected not in self.rings:
             return
-
-        try:
-            RASPBERRY_PI_IP = os.environ.get("RASPBERRY_PI_LOCAL_IP")
-            response = requests.get(f'http://{RASPBERRY_PI_IP}:5003/get_acceleration', timeout=0.5)
-            data = response.json()
-
-            # Update axis values
-            self.x_frame['value_label'].setText(f"{data['x']:.3f} g")
-            self.y_frame['value_label'].setText(f"{data['y']:.3f} g")
-            self.z_frame['value_label'].setText(f"{data['z']:.3f} g")
-
-            # Calculate PGA
-            pga = calculate_pga(data['x'], data['y'], data['z'])
-
-            # Update graph data
-            self.times.append(data['timestamp'])
-            self.x_data.append(data['x'])
-            self.y_data.append(data['y'])
-            self.z_data.append(data['z'])
-            self.pga_data.append(pga)
-
-            # Update PGA and intensity
-            self.pga_label.setText(f"Peak Ground Acceleration (PGA): {pga:.3f} g")
-            intensity, color = estimate_earthquake_intensity(pga)
-            self.intensity_label.setText(f"Intensity: {intensity}")
-            self.intensity_label.setStyleSheet(f"color: {color}")
-
-            self.status_label.setText("Status: Connected")
-            self.status_label.setStyleSheet("color: green")
-
-        except Exception as e:
-            self.status_label.setText(f"Status: Connection Error")
-            self.status_label.setStyleSheet("color: red")
+        ring = self.rings[self.selected]
+        count = ring.count
+        # Labels keep showing "No Data" until the first sample arrives
+        if count == 0 or count == self.shown:
+            return
+        self.shown = count
+        rows, _ = ring.since(count - 1)
+        if not len(rows):
+            return
+        x, y, z, pga, level = (rows[-1, ring.column(name)] for name in ('x', 'y', 'z', 'pga', 'level'))
+
+        # Update axis values; labels showing the same value are not touched
+        self.x_frame['value'].set(f"{x:.3f} g")
+        self.y_frame['value'].set(f"{y:.3f} g")
+        self.z_frame['value'].set(f"{z:.3f} g")
+
+        # Update PGA and intensity as classified by the worker
+        self.pga.set(f"Peak Ground Acceleration (PGA): {pga:.3f} g")
+        _, intensity, color = INTENSITY_LEVELS[int(level)]
+        self.intensity.set(f"Intensity: {intensity}", color)
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.timer.stop()
+            self.plot_timer.stop()
+            self.stop_event.set()
+            self.worker.join(2)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
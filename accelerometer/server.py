@@ -1,29 +1,73 @@
-from sense_hat import SenseHat
 from flask import Flask, jsonify
+import atexit
+import os, sys
 import time
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import ServerMetrics, register_metrics
+from common.sampler import Sampler
+from common.sensors import create_sense
+from common.serving import register_history, register_stream, run_server
+
 app = Flask(__name__)
 # Disable all Flask logs
 app.logger.disabled = True
 log = logging.getLogger('werkzeug')
 log.disabled = True
 
-sense = SenseHat()
+sense = create_sense()
+metrics = ServerMetrics()
+register_metrics(app, metrics)
 
+# Seconds between accelerometer reads, and samples kept for clients catching up after a disconnect
+SAMPLE_INTERVAL = float(os.environ.get('ACCEL_SAMPLE_INTERVAL', 0.1))
+HISTORY_SIZE = int(os.environ.get('ACCEL_HISTORY_SIZE', 6000))
+# Also publish the samples to a shared memory ring for other processes on the Pi, such as the LED display
+SHARED_RING = os.environ.get('SENSEHAT_SHARED_RINGS', '0') not in ('', '0')
 
-@app.route('/get_acceleration')
-def get_acceleration():
+publish_sample = None
+if SHARED_RING:
+    from common.shm_ring import publish_sensor_ring
+    ring = publish_sensor_ring('acceleration', HISTORY_SIZE)
+    atexit.register(ring.unlink)
+
+    def publish_sample(sample):
+        acceleration, seq, acquired = sample
+        ring.append([acquired, acceleration['x'], acceleration['y'], acceleration['z'], seq])
 
-    acceleration = sense.get_accelerometer_raw()
-    return jsonify({
+
+# Sample continuously, so samples taken while a client is disconnected can be backfilled
+sampler = Sampler(metrics, sense.get_accelerometer_raw, SAMPLE_INTERVAL, 2 * SAMPLE_INTERVAL, HISTORY_SIZE,
+                  on_sample=publish_sample).start()
+metrics.queue_depth = sampler.queue_depth
+
+
+def format_acceleration(sample):
+    acceleration, seq, acquired = sample
+    return {
         'x': acceleration['x'],
         'y': acceleration['y'],
         'z': acceleration['z'],
-        'timestamp': time.time()
-    })
+        # Wall-clock time of the read
+        'timestamp': time.time() - (time.monotonic() - acquired),
+        **metrics.stamp(seq, acquired)
+    }
+
+
+def read_acceleration():
+    return format_acceleration(sampler.latest())
+
+
+@app.route('/get_acceleration')
+def get_acceleration():
+    return jsonify(read_acceleration())
+
+
+register_stream(app, read_acceleration, default_interval=0.1)
+register_history(app, sampler, format_acceleration)
 
 
 if __name__ == '__main__':
     # Run Flask server on all network interfaces, port 5003
-    app.run(host='0.0.0.0', port=5003, debug=False)
\ No newline at end of file
+    run_server(app, 5003)
@@ -0,0 +1,132 @@
+import argparse
+import os
+import importlib.util
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CLIENTS = {
+    'tph': ('TPH/client.py', 'EnvironmentMonitor'),
+    'accelerometer': ('accelerometer/client.py', 'AccelerometerWindow'),
+}
+
+
+def tph_sample(pattern, tick):
+    if pattern == 'steady':
+        temperature = 22.5
+    elif pattern == 'changing':
+        temperature = 22.0 + (tick % 20) / 10
+    else:
+        # Crosses the 30°C highlight threshold on every tick
+        temperature = 29.5 + tick % 2
+    return {'temperature': temperature, 'humidity': 45.0 + (tick % 3 if pattern != 'steady' else 0),
+            'pressure': 1013.2, 'timestamp': '2024-01-01 00:00:00'}
+
+
+def accelerometer_sample(pattern, tick):
+    if pattern == 'steady':
+        x = 0.001
+    elif pattern == 'changing':
+        x = 0.001 * (tick % 10)
+    else:
+        # Alternates between two intensity levels on every tick
+        x = 0.01 if tick % 2 else 0.03
+    return {'x': x, 'y': 0.002, 'z': 0.978, 'timestamp': time.time()}
+
+
+SAMPLES = {'tph': tph_sample, 'accelerometer': accelerometer_sample}
+
+modules = {}
+
+
+def load_client(client):
+    # Import the client script once as a module, without running its main
+    if client not in modules:
+        path = os.path.join(ROOT, CLIENTS[client][0])
+        # Scripts import their sibling modules, as when run directly
+        sys.path.insert(0, os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location(f'{client}_client', path)
+        modules[client] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modules[client])
+    return modules[client]
+
+
+def measure(app, client, pattern, ticks):
+    """
+    Returns the GUI thread time in seconds of every tick: showing one new
+    sample and processing the events it posts, including the repaint.
+
+    TPH results are passed to the window as the poller would. Accelerometer
+    samples are analysed and written to the window's shared rings as the
+    worker process would, outside the measured time, and the tick is the
+    window reading them.
+    """
+    module = load_client(client)
+    window = getattr(module, CLIENTS[client][1])()
+    # Feed samples directly instead of starting the network poller or worker
+    window.started = True
+    if client == 'accelerometer':
+        from acquisition import analyse
+        window.create_rings()
+    window.show()
+    app.processEvents()
+
+    device = window.devices[0]
+    times = []
+    for tick in range(ticks):
+        data = SAMPLES[client](pattern, tick)
+        data.update(seq=tick + 1, age=0.0)
+        if client == 'accelerometer':
+            window.rings[device].append(analyse([data]))
+            started = time.perf_counter()
+            window.update_data()
+        else:
+            result = {'host': device, 'data': data, 'error': None, 'fetch': 0.001, 'parse': 0.0001,
+                      'received': time.monotonic(), 'backfill': []}
+            started = time.perf_counter()
+            window.handle_result(result)
+        app.processEvents()
+        times.append(time.perf_counter() - started)
+    window.close()
+    app.processEvents()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure GUI thread time per client update tick")
+    parser.add_argument('--clients', nargs='+', choices=list(CLIENTS), default=list(CLIENTS))
+    parser.add_argument('--patterns', nargs='+', choices=['steady', 'changing', 'flapping'],
+                        default=['steady', 'changing', 'flapping'],
+                        help="steady: repeated values, changing: new values in the same state, "
+                             "flapping: a threshold state change on every tick")
+    parser.add_argument('--ticks', type=int, default=2000, help="updates per pattern (default: 2000)")
+    parser.add_argument('--offscreen', action='store_true', help="render without a display")
+    args = parser.parse_args()
+
+    if args.offscreen:
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    os.environ.setdefault('RASPBERRY_PI_LOCAL_IP', '127.0.0.1')
+    # The TPH client writes every reading to environment_data.db in the working directory
+    os.chdir(tempfile.mkdtemp())
+
+    from PySide6.QtWidgets import QApplication
+
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+
+    for client in args.clients:
+        print(f"== {client} ({CLIENTS[client][0]})")
+        for pattern in args.patterns:
+            times = measure(app, client, pattern, args.ticks)
+            # The first ticks create the database and lay out the window
+            times = sorted(times[len(times) // 10:])
+            p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+            print(f"   {pattern:<10} mean {statistics.mean(times) * 1e6:8.0f} us  "
+                  f"p50 {statistics.median(times) * 1e6:8.0f} us  p99 {p99 * 1e6:8.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from threading import Thread, Event
+import numpy as np
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Server script, port and polled route of every sensor server
+SERVERS = {
+    'acceleration': {'script': 'accelerometer/server.py', 'port': 5003, 'route': '/get_acceleration'},
+    'orientation': {'script': 'gyroscope/server.py', 'port': 5002, 'route': '/orientation'},
+    'tph': {'script': 'TPH/server.py', 'port': 5001, 'route': '/data'},
+}
+
+# Deployment modes: SENSEHAT_SERVER value and whether clients poll or stream
+MODES = {
+    'dev': {'server': 'dev', 'streaming': False},
+    'waitress': {'server': 'waitress', 'streaming': False},
+    'streaming': {'server': 'dev', 'streaming': True},
+}
+
+
+def wait_for_port(port, process, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_server(name, mode, simulate):
+    env = dict(os.environ, SENSEHAT_SERVER=MODES[mode]['server'])
+    if simulate:
+        env['SENSEHAT_SIMULATE'] = '1'
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, SERVERS[name]['script'])], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if not wait_for_port(SERVERS[name]['port'], process):
+        process.kill()
+        error = process.communicate()[1].decode(errors='replace').strip().splitlines()
+        raise RuntimeError(error[-1] if error else "server did not start")
+    return process
+
+
+def new_client_stats():
+    """
+    Returns the counters of one client: requests sent, sequence numbers of
+    the distinct samples received, request round trips and sample ages in
+    seconds, and failed requests
+    """
+    return {'requests': 0, 'seqs': set(), 'round_trips': [], 'ages': [], 'errors': 0}
+
+
+def receive_sample(stats, sample):
+    # A poll repeats the cached sample until the sensor is read again, so only its first receipt counts
+    if sample['seq'] in stats['seqs']:
+        return
+    stats['seqs'].add(sample['seq'])
+    # Client and server run on the same host, so their monotonic clocks are comparable
+    stats['ages'].append(time.monotonic() - sample['monotonic'])
+
+
+def poll_client(url, interval, stop_event, stats):
+    """
+    Request url in a loop until stop_event is set, recording the round trip
+    of every request and the age of every distinct sample
+    """
+    session = requests.Session()
+    while not stop_event.is_set():
+        started = time.monotonic()
+        stats['requests'] += 1
+        try:
+            sample = session.get(url, timeout=5).json()
+            stats['round_trips'].append(time.monotonic() - started)
+            receive_sample(stats, sample)
+        except Exception:
+            stats['errors'] += 1
+        if interval:
+            stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+def stream_client(url, interval, stop_event, stats):
+    """
+    Read samples from a /stream route until stop_event is set, recording
+    the age of every sample. A stream is a single request, so it has no
+    per-sample round trip.
+    """
+    stats['requests'] += 1
+    try:
+        with requests.get(url, params={'interval': interval or 0}, stream=True, timeout=5) as response:
+            for line in response.iter_lines():
+                if stop_event.is_set():
+                    break
+                receive_sample(stats, json.loads(line))
+    except Exception:
+        stats['errors'] += 1
+
+
+def percentiles_ms(values):
+    # p50 and p99 in milliseconds, or None if nothing was measured
+    if not values:
+        return None, None
+    values_ms = np.array(values) * 1000
+    return float(np.percentile(values_ms, 50)), float(np.percentile(values_ms, 99))
+
+
+def server_metrics(port):
+    return requests.get(f'http://127.0.0.1:{port}/metrics', timeout=5).json()
+
+
+def run_case(name, mode, clients, duration, interval):
+    """
+    Drive one server with a number of concurrent clients and return a dict
+    of request and distinct sample rates, p50/p99 request round trip and
+    sample age, and server CPU time per distinct sample delivered
+    """
+    config = SERVERS[name]
+    streaming = MODES[mode]['streaming']
+    base = f"http://127.0.0.1:{config['port']}"
+    url = f"{base}/stream" if streaming else f"{base}{config['route']}"
+    target = stream_client if streaming else poll_client
+
+    stop_event = Event()
+    stats = [new_client_stats() for _ in range(clients)]
+    before = server_metrics(config['port'])
+    threads = [Thread(target=target, args=(url, interval, stop_event, client_stats), daemon=True)
+               for client_stats in stats]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    stop_event.wait(duration)
+    stop_event.set()
+    elapsed = time.monotonic() - started
+    after = server_metrics(config['port'])
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Every client receives each distinct sample once, whether it polls or streams, so CPU time per
+    # sample compares the modes; the server's samples_total counts background sensor reads instead
+    delivered = sum(len(client_stats['seqs']) for client_stats in stats)
+    cpu = after['cpu_time'] - before['cpu_time']
+    rtt_p50, rtt_p99 = percentiles_ms([t for client_stats in stats for t in client_stats['round_trips']])
+    age_p50, age_p99 = percentiles_ms([t for client_stats in stats for t in client_stats['ages']])
+    return {
+        'server': name,
+        'mode': mode,
+        'clients': clients,
+        'requests': sum(client_stats['requests'] for client_stats in stats),
+        'samples': delivered,
+        'errors': sum(client_stats['errors'] for client_stats in stats),
+        'request_rate': sum(client_stats['requests'] for client_stats in stats) / elapsed,
+        'sample_rate': delivered / elapsed,
+        'rtt_p50_ms': rtt_p50,
+        'rtt_p99_ms': rtt_p99,
+        'age_p50_ms': age_p50,
+        'age_p99_ms': age_p99,
+        'cpu_ms': cpu * 1000 / delivered if delivered else 0.0,
+    }
+
+
+def format_ms(value):
+    return f"{'-':>9}" if value is None else f"{value:>9.2f}"
+
+
+def print_row(result):
+    print(f"{result['server']:<13}{result['mode']:<11}{result['clients']:>8}{result['request_rate']:>8.1f}"
+          f"{result['sample_rate']:>8.1f}{format_ms(result['rtt_p50_ms'])}{format_ms(result['rtt_p99_ms'])}"
+          f"{format_ms(result['age_p50_ms'])}{format_ms(result['age_p99_ms'])}{result['cpu_ms']:>12.3f}"
+          f"{result['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the sensor servers in different deployment modes")
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 4, 16],
+                        help="concurrent client counts to test (default: 1 4 16)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per test case (default: 10)")
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help="seconds between requests of each client, 0 for as fast as possible (default: 0)")
+    parser.add_argument('--real', action='store_true', help="use the real Sense HAT instead of the simulated one")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    # Round trip: request to response of a poll; age: acquisition to receipt of a distinct sample
+    print(f"{'server':<13}{'mode':<11}{'clients':>8}{'req/s':>8}{'smp/s':>8}{'rtt p50':>9}{'rtt p99':>9}"
+          f"{'age p50':>9}{'age p99':>9}{'CPU ms/smp':>12}{'errors':>8}")
+    for mode in args.modes:
+        for name in args.servers:
+            try:
+                process = start_server(name, mode, simulate=not args.real)
+            except RuntimeError as e:
+                print(f"{name:<13}{mode:<11}  unavailable: {e}")
+                continue
+            try:
+                for clients in args.clients:
+                    result = run_case(name, mode, clients, args.duration, args.interval)
+                    results.append(result)
+                    print_row(result)
+            finally:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
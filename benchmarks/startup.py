@@ -0,0 +1,135 @@
+import argparse
+import os
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CLIENTS = {
+    'tph': 'TPH/client.py',
+    'accelerometer': 'accelerometer/client.py',
+    'gyroscope': 'gyroscope/client.py',
+}
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def report_first_frame():
+    # Monotonic time is system-wide, so the parent can subtract its spawn time
+    print(f"FIRST_FRAME {time.monotonic()}", flush=True)
+    os._exit(0)
+
+
+def probe(client):
+    """
+    Run a client in this process and exit as soon as its first frame has
+    been drawn: the first paint of a Qt window or the first pygame flip
+    """
+    path = os.path.join(ROOT, CLIENTS[client])
+    if client == 'gyroscope':
+        import pygame
+
+        flip = pygame.display.flip
+
+        def first_flip():
+            flip()
+            report_first_frame()
+
+        pygame.display.flip = first_flip
+    else:
+        from PySide6.QtCore import QObject, QEvent, QTimer
+        from PySide6.QtWidgets import QApplication
+
+        class FirstPaint(QObject):
+            def eventFilter(self, watched, event):
+                if event.type() == QEvent.Paint:
+                    # Report once the paint has been handled
+                    QTimer.singleShot(0, report_first_frame)
+                return False
+
+        exec_ = QApplication.exec
+        first_paint = FirstPaint()
+
+        def exec_with_probe(*args):
+            QApplication.instance().installEventFilter(first_paint)
+            return exec_()
+
+        QApplication.exec = exec_with_probe
+    sys.argv = [path]
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name='__main__')
+
+
+def run_probe(client, env, importtime=False):
+    """
+    Returns (time to first frame in seconds, stderr) of one client start
+    """
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               os.path.abspath(__file__), '--probe', client]
+    started = time.monotonic()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=120)
+    match = re.search(r'FIRST_FRAME (\S+)', result.stdout)
+    if not match:
+        error = result.stderr.strip().splitlines()
+        raise RuntimeError(error[-1] if error else "no frame was drawn")
+    return float(match.group(1)) - started, result.stderr
+
+
+def import_breakdown(stderr):
+    """
+    Returns {top-level package: cumulative import ms} of the imports that
+    happened before the first frame
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Nested imports are indented and already counted in their parent
+        if not match or match.group(3) != ' ':
+            continue
+        package = match.group(4).split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(match.group(2)) / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure client start-up: import time breakdown and time to first frame")
+    parser.add_argument('--clients', nargs='+', choices=list(CLIENTS), default=list(CLIENTS))
+    parser.add_argument('--runs', type=int, default=5, help="starts per client for time to first frame (default: 5)")
+    parser.add_argument('--top', type=int, default=10, help="slowest packages to list (default: 10)")
+    parser.add_argument('--offscreen', action='store_true', help="render Qt clients without a display")
+    parser.add_argument('--probe', choices=list(CLIENTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe)
+        return
+
+    env = dict(os.environ)
+    env.setdefault('RASPBERRY_PI_LOCAL_IP', '127.0.0.1')
+    if args.offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+
+    for client in args.clients:
+        print(f"== {client} ({CLIENTS[client]})")
+        try:
+            # The first start warms the file system cache and is not counted
+            run_probe(client, env)
+            frames = [run_probe(client, env)[0] * 1000 for _ in range(args.runs)]
+            _, stderr = run_probe(client, env, importtime=True)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"   unavailable: {e}")
+            continue
+        print(f"   time to first frame: median {statistics.median(frames):.0f} ms, "
+              f"min {min(frames):.0f} ms, max {max(frames):.0f} ms over {args.runs} runs")
+        totals = import_breakdown(stderr)
+        print(f"   imports before first frame: {sum(totals.values()):.0f} ms")
+        for package, ms in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"     {package:<24}{ms:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import time
+
+# Share of the polling interval a request round trip may take before the rate is lowered for the link
+LATENCY_SHARE = 0.5
+# Weight of a new round trip time in its moving average
+LATENCY_SMOOTHING = 0.2
+
+
+class AdaptiveRate:
+    """
+    Polling interval of one device stream that follows the signal and the
+    link, so quiet sensors cost few requests and events keep full detail.
+
+    The caller reduces every sample to one activity value, e.g. the peak
+    ground acceleration or how far a reading moved. A value reaching
+    `active` drops the interval to min_interval at once and holds it for
+    `hold` seconds after the last active sample. Once activity stays below
+    `quiet`, the interval doubles every `double_after` seconds up to
+    max_interval; activity in between keeps the current interval.
+
+    The link sets a floor under the interval: a round trip may take at
+    most LATENCY_SHARE of it, up to max_interval, and every consecutive
+    error doubles the interval up to error_interval until a request
+    succeeds again.
+    """
+
+    def __init__(self, min_interval, max_interval, active, quiet, hold, double_after, error_interval=None):
+        """
+        Args:
+            min_interval (float): seconds between requests during activity
+            max_interval (float): seconds between requests when quiet
+            active (float): activity that raises the rate to the maximum
+            quiet (float): activity below which the rate backs off
+            hold (float): seconds the maximum rate is kept after activity
+            double_after (float): seconds of quiet per doubling of the interval
+            error_interval (float): longest interval after errors
+                (default: max_interval)
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.active = active
+        self.quiet = quiet
+        self.hold = hold
+        self.double_after = double_after
+        self.error_interval = error_interval if error_interval is not None else max_interval
+        self.signal_interval = min_interval
+        self.hold_until = 0.0
+        self.observed = None
+        self.round_trip = None
+        self.error_floor = 0.0
+        self.interval = min_interval
+        self.reason = 'steady'
+
+    @property
+    def rate(self):
+        # Requests per second
+        return 1.0 / self.interval
+
+    def observe(self, activity, now=None):
+        """
+        Adjust the interval to the activity of a new sample
+        """
+        now = time.monotonic() if now is None else now
+        if activity >= self.active:
+            self.signal_interval = self.min_interval
+            self.hold_until = now + self.hold
+        elif activity < self.quiet and now >= self.hold_until and self.observed is not None:
+            # Time-based, so the back-off does not depend on the current rate
+            growth = 2 ** ((now - max(self.observed, self.hold_until)) / self.double_after)
+            self.signal_interval = min(self.signal_interval * growth, self.max_interval)
+        self.observed = now
+        self.update(now)
+
+    def link(self, round_trip, error):
+        """
+        Adjust the interval to the outcome of a request: its round trip in
+        seconds, and whether it failed
+        """
+        if error:
+            self.error_floor = min(self.interval * 2, self.error_interval)
+        else:
+            self.error_floor = 0.0
+            if self.round_trip is None:
+                self.round_trip = round_trip
+            else:
+                self.round_trip += LATENCY_SMOOTHING * (round_trip - self.round_trip)
+        self.update(time.monotonic())
+
+    def update(self, now):
+        latency_floor = min((self.round_trip or 0.0) / LATENCY_SHARE, self.max_interval)
+        self.interval = max(self.signal_interval, latency_floor, self.error_floor)
+        if self.error_floor >= self.interval:
+            self.reason = 'error'
+        elif latency_floor > self.signal_interval:
+            self.reason = 'link'
+        elif now < self.hold_until:
+            self.reason = 'active'
+        else:
+            self.reason = 'quiet' if self.signal_interval > self.min_interval else 'steady'
+
+    def overlay_text(self):
+        return f"rate {self.rate:.1f}/s {self.reason}"
@@ -0,0 +1,226 @@
+import json
+import numpy as np
+
+from common.seismic import pga
+
+KINDS = ('threshold', 'rate', 'aggregate')
+AGGREGATES = ('mean', 'std', 'min', 'max', 'range')
+
+# Values computed from the stream fields that rules can use like a field
+DERIVED_FIELDS = {
+    # Peak ground acceleration in g
+    'pga': (('x', 'y', 'z'), pga),
+}
+
+
+def load_rules(path):
+    """
+    Read alert rules from a JSON file holding a list of rule objects:
+
+        name       unique name reported with the alert
+        stream     stream the rule watches, e.g. 'tph'
+        field      stream field or derived field, e.g. 'temperature' or 'pga'
+        kind       'threshold' on the value (default), 'rate' of change per
+                   second over window seconds, or 'aggregate' over the last
+                   window seconds
+        aggregate  'mean', 'std', 'min', 'max' or 'range' for aggregate rules
+        window     seconds; for rate rules 0 compares with the previous sample,
+                   otherwise the rate is only evaluated once window seconds
+                   of samples have been seen
+        above      raise when the value rises above this, or
+        below      raise when the value falls below this
+        clear      clear once the value is back past this (hysteresis),
+                   defaults to the raise threshold
+        for        seconds the condition must hold before raising (debounce)
+
+    Raises:
+        ValueError: if a rule is invalid
+    """
+    with open(path) as f:
+        rules = json.load(f)
+    names = set()
+    for rule in rules:
+        name = rule.get('name')
+        if not name or name in names:
+            raise ValueError(f"Alert rule names must be unique and non-empty: {name!r}")
+        names.add(name)
+        rule.setdefault('kind', 'threshold')
+        if rule['kind'] not in KINDS:
+            raise ValueError(f"Alert rule {name}: unknown kind {rule['kind']!r}")
+        if ('above' in rule) == ('below' in rule):
+            raise ValueError(f"Alert rule {name}: needs exactly one of 'above' and 'below'")
+        if rule['kind'] == 'aggregate' and rule.get('aggregate') not in AGGREGATES:
+            raise ValueError(f"Alert rule {name}: aggregate must be one of {', '.join(AGGREGATES)}")
+        if rule['kind'] == 'aggregate' and not rule.get('window', 0) > 0:
+            raise ValueError(f"Alert rule {name}: aggregate rules need a window in seconds")
+        if 'stream' not in rule or 'field' not in rule:
+            raise ValueError(f"Alert rule {name}: needs a stream and a field")
+    return rules
+
+
+class AlertEngine:
+    """
+    Evaluates the alert rules of one stream over batches of samples.
+
+    Every rule reads one signal: a field value, its rate of change or a
+    windowed aggregate. Each distinct signal is computed once per batch as
+    a column, and all rules are then evaluated together as arrays of
+    shape (samples, rules), so the cost per sample does not involve a
+    Python loop over rules. The last samples are kept between batches to
+    fill the windows, and the hysteresis, debounce and active state of
+    every rule carries over from one batch to the next.
+    """
+
+    def __init__(self, stream, fields, rules):
+        """
+        Args:
+            stream (str): name of the stream, selects the rules that apply
+            fields (list): names of the stream fields, in sample order
+            rules (list): rule dicts as returned by load_rules()
+
+        Raises:
+            ValueError: if a rule uses a field the stream does not have
+        """
+        self.stream = stream
+        self.fields = list(fields)
+        self.rules = [rule for rule in rules if rule['stream'] == stream]
+        for rule in self.rules:
+            if rule['field'] not in self.fields and rule['field'] not in DERIVED_FIELDS:
+                raise ValueError(f"Alert rule {rule['name']}: stream {stream} has no field {rule['field']!r}")
+
+        # One column per distinct signal, shared by every rule that reads it
+        self.signals = []
+        columns = []
+        for rule in self.rules:
+            signal = (rule['field'], rule['kind'], rule.get('aggregate'), float(rule.get('window', 0)))
+            if signal not in self.signals:
+                self.signals.append(signal)
+            columns.append(self.signals.index(signal))
+        self.columns = np.array(columns, dtype=np.intp)
+
+        # Rising above a threshold is the same as the negated value falling below it
+        self.sign = np.array([1.0 if 'above' in rule else -1.0 for rule in self.rules])
+        self.raise_at = np.array([rule.get('above', rule.get('below')) for rule in self.rules], dtype=float)
+        self.clear_at = np.array([rule.get('clear', rule.get('above', rule.get('below'))) for rule in self.rules],
+                                 dtype=float)
+        self.delay = np.array([rule.get('for', 0.0) for rule in self.rules], dtype=float)
+        self.window = max((signal[3] for signal in self.signals), default=0.0)
+
+        count = len(self.rules)
+        self.condition = np.zeros(count, dtype=bool)
+        self.since = np.full(count, np.nan)
+        self.active = np.zeros(count, dtype=bool)
+        self.tail_t = np.empty(0)
+        self.tail = {field: np.empty(0) for field in self.fields}
+        # Time of the first sample ever processed, as the tail drops it once it leaves every window
+        self.first_t = None
+
+    def process(self, t, values):
+        """
+        Evaluate a batch of samples and return the alerts raised or cleared
+        by it, oldest first, as dicts with 'rule', 'stream', 'field',
+        'state' ('raised' or 'cleared'), 't' and 'value'
+
+        Args:
+            t (array): acquisition times of the samples, ascending
+            values (dict): {field: array of values} for every stream field
+        """
+        if not self.rules or len(t) == 0:
+            return []
+        t = np.concatenate([self.tail_t, np.asarray(t, dtype=float)])
+        if self.first_t is None:
+            self.first_t = t[0]
+        values = {field: np.concatenate([self.tail[field], np.asarray(values[field], dtype=float)])
+                  for field in self.fields}
+        first = len(self.tail_t)
+        rows = np.arange(first, len(t))
+
+        signals = np.column_stack([self.signal(signal, t, values, rows) for signal in self.signals])
+        value = signals[:, self.columns]
+        events = self.evaluate(t[first:], value)
+
+        # Keep the samples the widest window still needs, and the previous sample for rates
+        keep = min(int(np.searchsorted(t, t[-1] - self.window, side='left')), len(t) - 1)
+        self.tail_t = t[keep:]
+        self.tail = {field: column[keep:] for field, column in values.items()}
+        return events
+
+    def signal(self, signal, t, values, rows):
+        field, kind, aggregate, window = signal
+        if field in DERIVED_FIELDS:
+            inputs, derive = DERIVED_FIELDS[field]
+            series = derive(*(values[name] for name in inputs))
+        else:
+            series = values[field]
+
+        if kind == 'threshold':
+            return series[rows]
+
+        if kind == 'rate':
+            if window > 0:
+                start = np.minimum(np.searchsorted(t, t[rows] - window, side='left'), rows)
+            else:
+                start = np.maximum(rows - 1, 0)
+            elapsed = t[rows] - t[start]
+            # Until the window has filled, a single rounding step would read as a steep rate; NaN keeps the state
+            valid = (elapsed > 0) & (t[rows] - self.first_t >= window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(valid, (series[rows] - series[start]) / elapsed, np.nan)
+
+        # Samples in (t - window, t] of every row
+        start = np.searchsorted(t, t[rows] - window, side='right')
+        end = rows + 1
+        count = end - start
+        if aggregate in ('mean', 'std'):
+            sums = np.concatenate([[0.0], np.cumsum(series)])
+            mean = (sums[end] - sums[start]) / count
+            if aggregate == 'mean':
+                return mean
+            squares = np.concatenate([[0.0], np.cumsum(series * series)])
+            return np.sqrt(np.maximum((squares[end] - squares[start]) / count - mean * mean, 0.0))
+
+        # Gather every window into a (rows, longest window) matrix, padding outside the window
+        offsets = end[:, None] - 1 - np.arange(count.max())[None, :]
+        inside = offsets >= start[:, None]
+        window_values = series[np.maximum(offsets, 0)]
+        highest = np.where(inside, window_values, -np.inf).max(axis=1)
+        lowest = np.where(inside, window_values, np.inf).min(axis=1)
+        if aggregate == 'max':
+            return highest
+        if aggregate == 'min':
+            return lowest
+        return highest - lowest
+
+    def evaluate(self, t, value):
+        samples = np.arange(len(t))[:, None]
+
+        # +1 where a rule's raise condition holds, -1 where its clear condition
+        # holds, 0 in between, where the previous state is kept (hysteresis)
+        signed = value * self.sign
+        change = np.where(signed > self.raise_at * self.sign, 1, np.where(signed < self.clear_at * self.sign, -1, 0))
+        last_change = np.maximum.accumulate(np.where(change != 0, samples, -1), axis=0)
+        rules = np.arange(len(self.rules))
+        condition = np.where(last_change >= 0, change[np.maximum(last_change, 0), rules] == 1, self.condition)
+
+        # Time the condition last started holding, to debounce raising
+        previous = np.vstack([self.condition, condition[:-1]])
+        started = np.maximum.accumulate(np.where(condition & ~previous, samples, -1), axis=0)
+        since = np.where(started >= 0, t[np.maximum(started, 0)], self.since)
+        active = condition & (t[:, None] - since >= self.delay)
+
+        events = []
+        before = np.vstack([self.active, active[:-1]])
+        for sample, rule in zip(*np.nonzero(active != before)):
+            events.append({
+                'rule': self.rules[rule]['name'],
+                'stream': self.stream,
+                'field': self.rules[rule]['field'],
+                'state': 'raised' if active[sample, rule] else 'cleared',
+                't': float(t[sample]),
+                'value': float(value[sample, rule]),
+            })
+
+        self.condition = condition[-1]
+        self.since = since[-1]
+        self.active = active[-1]
+        return events
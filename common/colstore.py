@@ -0,0 +1,168 @@
+import os
+import time
+from threading import Lock
+import numpy as np
+
+# Time index record of every row: acquisition time and server sequence number
+INDEX_DTYPE = np.dtype([('t', '<f8'), ('seq', '<i8')])
+VALUE_DTYPE = np.dtype('<f4')
+
+
+class ColumnStore:
+    """
+    Append-only columnar storage of one sensor stream.
+
+    A stream directory holds segments named after the time of their first
+    row. Each segment is a time index file (float64 time, int64 sequence
+    number) plus one float32 file per field, all fixed width, so any row
+    range can be memory-mapped and sliced without parsing. Rows are buffered
+    and written in chunks, and a new segment is started when the current
+    one exceeds a size or age limit. The oldest segments are deleted once
+    the stream exceeds its retention size.
+    """
+
+    def __init__(self, root, stream, fields, segment_bytes=64 * 2 ** 20, segment_seconds=3600,
+                 retention_bytes=None, chunk_rows=256):
+        """
+        Args:
+            root (str): directory holding one sub-directory per stream
+            stream (str): stream name, e.g. 'acceleration'
+            fields (list): names of the float32 value columns
+            segment_bytes (int): start a new segment above this size
+            segment_seconds (float): start a new segment after this many seconds
+            retention_bytes (int): delete the oldest segments above this total size, None keeps all
+            chunk_rows (int): rows buffered in memory before they are written
+        """
+        self.path = os.path.join(root, stream)
+        self.fields = list(fields)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention_bytes = retention_bytes
+        self.chunk_rows = chunk_rows
+        self.row_bytes = INDEX_DTYPE.itemsize + VALUE_DTYPE.itemsize * len(self.fields)
+        self.lock = Lock()
+        self.pending = []
+        self.segment = None
+        self.segment_rows = 0
+        self.segment_started = 0.0
+        os.makedirs(self.path, exist_ok=True)
+
+    def files(self, segment):
+        base = os.path.join(self.path, segment)
+        return base + '.index', {field: f'{base}.{field}.f32' for field in self.fields}
+
+    def segments(self):
+        # Segment names sort by their zero-padded start time in milliseconds
+        return sorted(name[:-len('.index')] for name in os.listdir(self.path) if name.endswith('.index'))
+
+    def append(self, t, seq, values):
+        """
+        Buffer one row; it is written once chunk_rows rows are pending or on flush()
+        """
+        with self.lock:
+            self.pending.append((t, seq, *values))
+            if len(self.pending) >= self.chunk_rows:
+                self._write()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def pending_rows(self):
+        return len(self.pending)
+
+    def _write(self):
+        if not self.pending:
+            return
+        rows = np.array(self.pending, dtype=np.float64)
+        self.pending = []
+        if (self.segment is None or self.segment_rows * self.row_bytes >= self.segment_bytes
+                or time.time() - self.segment_started >= self.segment_seconds):
+            self._rotate(rows[0, 0])
+
+        index = np.empty(len(rows), dtype=INDEX_DTYPE)
+        index['t'] = rows[:, 0]
+        index['seq'] = rows[:, 1]
+        index_file, value_files = self.files(self.segment)
+        # Values first, so a crash never leaves index rows without values
+        for i, field in enumerate(self.fields, start=2):
+            with open(value_files[field], 'ab') as f:
+                rows[:, i].astype(VALUE_DTYPE).tofile(f)
+        with open(index_file, 'ab') as f:
+            index.tofile(f)
+        self.segment_rows += len(rows)
+
+    def _rotate(self, first_time):
+        self.segment = f'{int(first_time * 1000):015d}'
+        self.segment_rows = 0
+        self.segment_started = time.time()
+        if self.retention_bytes is None:
+            return
+        segments = self.segments()
+        sizes = [self.segment_size(segment) for segment in segments]
+        while segments and sum(sizes) > self.retention_bytes:
+            index_file, value_files = self.files(segments.pop(0))
+            sizes.pop(0)
+            for path in [index_file, *value_files.values()]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def segment_size(self, segment):
+        index_file, value_files = self.files(segment)
+        return sum(os.path.getsize(path) for path in [index_file, *value_files.values()] if os.path.exists(path))
+
+    def open_segment(self, segment):
+        """
+        Returns (index, columns) of a segment as read-only memory maps, cut
+        to the rows present in every file
+        """
+        index_file, value_files = self.files(segment)
+        rows = os.path.getsize(index_file) // INDEX_DTYPE.itemsize
+        for path in value_files.values():
+            rows = min(rows, os.path.getsize(path) // VALUE_DTYPE.itemsize if os.path.exists(path) else 0)
+        if rows == 0:
+            return np.empty(0, dtype=INDEX_DTYPE), {field: np.empty(0, dtype=VALUE_DTYPE) for field in self.fields}
+        index = np.memmap(index_file, dtype=INDEX_DTYPE, mode='r', shape=(rows,))
+        columns = {field: np.memmap(path, dtype=VALUE_DTYPE, mode='r', shape=(rows,))
+                   for field, path in value_files.items()}
+        return index, columns
+
+    def iter_range(self, start=None, end=None, chunk_rows=65536):
+        """
+        Yield the rows with start <= t < end as dicts of arrays ('t', 'seq'
+        and one array per field) of at most chunk_rows rows each. Only the
+        yielded chunk is copied into memory, so ranges of any length can be
+        read in constant memory.
+        """
+        self.flush()
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        segments = self.segments()
+        for i, segment in enumerate(segments):
+            # Skip segments that end before the range or start after it
+            if i + 1 < len(segments) and int(segments[i + 1]) / 1000 <= start:
+                continue
+            if int(segment) / 1000 >= end:
+                break
+            index, columns = self.open_segment(segment)
+            first = int(np.searchsorted(index['t'], start, side='left'))
+            last = int(np.searchsorted(index['t'], end, side='left'))
+            for offset in range(first, last, chunk_rows):
+                stop = min(offset + chunk_rows, last)
+                chunk = {'t': np.array(index['t'][offset:stop]), 'seq': np.array(index['seq'][offset:stop])}
+                for field, column in columns.items():
+                    chunk[field] = np.array(column[offset:stop])
+                yield chunk
+
+    def bounds(self):
+        """
+        Returns (first, last) stored row times, or (None, None) if empty
+        """
+        self.flush()
+        first = last = None
+        for segment in self.segments():
+            index, _ = self.open_segment(segment)
+            if len(index):
+                first = index['t'][0] if first is None else first
+                last = index['t'][-1]
+        return first, last
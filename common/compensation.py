@@ -0,0 +1,56 @@
+import math
+
+
+class TemperatureCompensator:
+    """
+    Estimates the room temperature from the Sense HAT temperature sensors,
+    which sit on top of the Raspberry Pi and read high because of the CPU
+    heat below them.
+
+    The sensor temperature is the mean of the humidity and pressure sensor
+    readings. It lies between the room and the CPU temperature, so the room
+    temperature is recovered by moving away from the CPU temperature:
+
+        room = sensor - (cpu - sensor) / factor + offset
+
+    factor describes how well the HAT is shielded from the CPU and offset any
+    remaining sensor bias; both are calibrated against a reference
+    thermometer. The CPU temperature reacts to load within a second, so the
+    estimate is smoothed by an exponential moving average with time
+    constant tau seconds, which keeps it stable at the native sample rate.
+    """
+
+    def __init__(self, factor, offset=0.0, tau=10.0):
+        """
+        Args:
+            factor (float): CPU heat shielding factor of the model
+            offset (float): correction added to the estimate in °C
+            tau (float): time constant of the smoothing filter in seconds, 0 disables it
+        """
+        self.factor = factor
+        self.offset = offset
+        self.tau = tau
+        self.value = None
+        self.updated = None
+
+    def estimate(self, humidity_temperature, pressure_temperature, cpu_temperature):
+        """
+        Returns the room temperature of one reading, without filtering
+        """
+        sensor = (humidity_temperature + pressure_temperature) / 2
+        return sensor - (cpu_temperature - sensor) / self.factor + self.offset
+
+    def update(self, t, humidity_temperature, pressure_temperature, cpu_temperature):
+        """
+        Add a reading taken at monotonic time t and return the filtered
+        room temperature
+        """
+        value = self.estimate(humidity_temperature, pressure_temperature, cpu_temperature)
+        if self.value is None or self.tau <= 0:
+            self.value = value
+        else:
+            # Weight by the time since the last reading, so irregular reads filter the same
+            alpha = 1 - math.exp(-(t - self.updated) / self.tau)
+            self.value += alpha * (value - self.value)
+        self.updated = t
+        return self.value
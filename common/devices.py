@@ -0,0 +1,143 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bound on concurrent requests regardless of the number of devices
+MAX_WORKERS = 16
+# Samples requested per /history call, and at most per reconnect
+BACKFILL_CHUNK = 1000
+MAX_BACKFILL = 10000
+
+
+def device_hosts():
+    """
+    Returns the Raspberry Pi addresses listed in RASPBERRY_PI_LOCAL_IP,
+    which may hold one address or a comma-separated list
+    """
+    value = os.environ.get("RASPBERRY_PI_LOCAL_IP") or ""
+    return [host.strip() for host in value.split(',') if host.strip()]
+
+
+class DevicePoller:
+    """
+    Polls the same route on many devices concurrently from a bounded thread
+    pool. Every device has its own keep-alive session and at most one request
+    in flight, so a slow or unreachable board never delays the others and
+    the caller's thread never waits on the network.
+
+    After a failed request the next successful one also fetches the samples
+    the device took in between from its /history route, in chunks and up
+    to a bounded count, so an outage costs a few bulk requests rather than
+    lost data. With catch_up, the samples a device took between two
+    successful polls are fetched the same way, so polling slower than the
+    server samples loses nothing either.
+    """
+
+    def __init__(self, hosts, port, route, timeout, callback, max_workers=MAX_WORKERS, backfill=False,
+                 catch_up=False):
+        """
+        Args:
+            hosts (list): device addresses
+            port (int): server port on every device
+            route (str): route to request, e.g. '/data'
+            timeout (float): request timeout in seconds
+            callback (callable): called from a worker thread with a result
+                dict for every finished request, see fetch()
+            max_workers (int): maximum number of concurrent requests
+            backfill (bool): fetch missed samples from /history after errors
+            catch_up (bool): with backfill, also fetch the samples skipped
+                between successful polls
+        """
+        # requests takes a noticeable part of client start-up, so it is imported on first use
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.hosts = list(hosts)
+        self.port = port
+        self.route = route
+        self.timeout = timeout
+        self.callback = callback
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(len(self.hosts), max_workers)))
+        self.sessions = {}
+        for host in self.hosts:
+            session = requests.Session()
+            # One pooled connection per device is enough with one request in flight
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            self.sessions[host] = session
+        self.in_flight = set()
+        self.backfill = backfill
+        self.catch_up = catch_up
+        self.last_seq = {}
+        self.disconnected = set()
+
+    def request(self, hosts=None):
+        """
+        Start a request on every device, or every one of hosts, that has
+        none in flight
+        """
+        for host in self.hosts if hosts is None else hosts:
+            if host not in self.in_flight:
+                self.in_flight.add(host)
+                try:
+                    self.executor.submit(self.fetch, host)
+                except RuntimeError:
+                    # The pool was shut down while the window is closing
+                    return
+
+    def fetch(self, host):
+        """
+        Request the route on one device and pass the callback a dict with the
+        device host, decoded data (None on error), error, fetch and parse
+        durations in seconds, the time.monotonic() value of receipt and
+        'backfill', the missed samples older than data, oldest first
+        """
+        result = {'host': host, 'data': None, 'error': None, 'fetch': 0.0, 'parse': 0.0, 'received': 0.0,
+                  'backfill': []}
+        try:
+            started = time.monotonic()
+            response = self.sessions[host].get(f'http://{host}:{self.port}{self.route}', timeout=self.timeout)
+            result['received'] = time.monotonic()
+            result['data'] = response.json()
+            result['fetch'] = result['received'] - started
+            result['parse'] = time.monotonic() - result['received']
+
+            seq = result['data'].get('seq')
+            last_seq = self.last_seq.get(host)
+            missed = host in self.disconnected or self.catch_up
+            if self.backfill and missed and seq is not None and last_seq is not None:
+                result['backfill'] = self.fetch_history(host, last_seq, seq)
+            self.disconnected.discard(host)
+            if seq is not None:
+                self.last_seq[host] = seq
+        except Exception as e:
+            result['error'] = e
+            self.disconnected.add(host)
+        finally:
+            self.in_flight.discard(host)
+        self.callback(result)
+
+    def fetch_history(self, host, since, until):
+        """
+        Returns the samples with since < seq < until from the device history,
+        oldest first. A restarted server (until <= since) has nothing to
+        recover, and samples that already left the history are skipped.
+        """
+        samples = []
+        while since < until - 1 and len(samples) < MAX_BACKFILL:
+            try:
+                response = self.sessions[host].get(
+                    f'http://{host}:{self.port}/history',
+                    params={'since': since, 'limit': min(BACKFILL_CHUNK, MAX_BACKFILL - len(samples))},
+                    timeout=self.timeout * 4)
+                chunk = [sample for sample in response.json()['samples'] if sample['seq'] < until]
+            except Exception:
+                break
+            if not chunk:
+                break
+            samples.extend(chunk)
+            since = chunk[-1]['seq']
+        return samples
+
+    def shutdown(self, wait=False):
+        # Wait for requests in flight to finish, so no callback runs afterwards
+        self.executor.shutdown(wait=wait, cancel_futures=True)
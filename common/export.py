@@ -0,0 +1,379 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from itertools import chain
+import numpy as np
+
+from common.colstore import ColumnStore
+
+# Rows read, converted and written at a time; memory use does not grow with the range
+CHUNK_ROWS = 65536
+# Output formats by file extension
+FORMATS = {'.csv': 'csv', '.npy': 'npy', '.npz': 'npz', '.bin': 'bin'}
+# First line of the compact binary format; a JSON line with the record layout follows
+BINARY_MAGIC = b'SENSEHAT-ROWS 1\n'
+# Bytes reserved for the .npy header, so it can be rewritten once the row count is known
+NPY_HEADER_BYTES = 256
+RESAMPLE_METHODS = ('mean', 'min', 'max', 'first', 'last')
+# Timestamp format of the TPH client database, in local time
+DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def column_dtype(name):
+    # Times stay exact, sequence numbers are integers, sensor values fit float32
+    if name == 't':
+        return np.dtype('<f8')
+    if name == 'seq':
+        return np.dtype('<i8')
+    return np.dtype('<f4')
+
+
+def empty_chunk(columns):
+    return {name: np.empty(0, dtype=column_dtype(name)) for name in columns}
+
+
+def stored_fields(root, stream):
+    """
+    Returns the field names of a stream written by the sensor logger, read
+    from the names of its segment files
+    """
+    path = os.path.join(root, stream)
+    if not os.path.isdir(path):
+        raise ValueError(f"No stored stream {stream!r} in {root}")
+    fields = set()
+    for name in os.listdir(path):
+        # <segment>.<field>.f32
+        if name.endswith('.f32'):
+            fields.add(name.split('.')[1])
+    return sorted(fields)
+
+
+def iter_store(root, stream, start=None, end=None, fields=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield the rows of a logged stream with start <= t < end as dicts of
+    arrays ('t', 'seq' and one per field) of at most chunk_rows rows
+
+    Args:
+        root (str): storage directory of the sensor logger
+        stream (str): stream name, e.g. 'acceleration'
+        start, end (float): Unix timestamps, open-ended if None
+        fields (list): fields to read, all if None
+        chunk_rows (int): rows per chunk
+    """
+    available = stored_fields(root, stream)
+    fields = available if fields is None else list(fields)
+    unknown = set(fields) - set(available)
+    if unknown:
+        raise ValueError(f"Stream {stream} has no fields {', '.join(sorted(unknown))}")
+    store = ColumnStore(root, stream, available)
+    found = False
+    for chunk in store.iter_range(start, end, chunk_rows=chunk_rows):
+        found = True
+        yield {name: chunk[name] for name in ['t', 'seq', *fields]}
+    if not found:
+        yield empty_chunk(['t', 'seq', *fields])
+
+
+def local_times(strings):
+    """
+    Returns Unix timestamps of local time strings in DB_TIME_FORMAT
+    """
+    naive = np.array(strings, dtype='datetime64[s]').astype(np.int64).astype(np.float64)
+    if not len(naive):
+        return naive
+    # One UTC offset for the chunk unless it spans a daylight saving change
+    first = time.mktime(time.strptime(strings[0], DB_TIME_FORMAT)) - naive[0]
+    last = time.mktime(time.strptime(strings[-1], DB_TIME_FORMAT)) - naive[-1]
+    if first == last:
+        return naive + first
+    return np.array([time.mktime(time.strptime(value, DB_TIME_FORMAT)) for value in strings])
+
+
+def iter_database(path, start=None, end=None, device=None, fields=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield the TPH readings stored by the TPH client with start <= t < end
+    as dicts of arrays ('t' and one per field) of at most chunk_rows rows
+
+    Args:
+        path (str): path of environment_data.db
+        start, end (float): Unix timestamps, open-ended if None
+        device (str): device address, may be omitted if the database holds one
+            device, and must be if it has no device column
+        fields (list): subset of temperature, humidity and pressure, all if None
+        chunk_rows (int): rows per chunk
+
+    Raises:
+        ValueError: if device is omitted and the database holds several devices
+        sqlite3.Error: if the database cannot be opened or read
+    """
+    available = ['temperature', 'humidity', 'pressure']
+    fields = available if fields is None else list(fields)
+    unknown = set(fields) - set(available)
+    if unknown:
+        raise ValueError(f"The database has no fields {', '.join(sorted(unknown))}")
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        # Databases written before the client monitored several devices have no device column
+        columns = [row[1] for row in db.execute("PRAGMA table_info(readings)")]
+        if not columns:
+            raise ValueError(f"{path} has no readings table")
+        conditions = []
+        params = []
+        if 'device' in columns:
+            if device is None:
+                devices = [row[0] for row in db.execute("SELECT DISTINCT device FROM readings")]
+                if len(devices) > 1:
+                    raise ValueError(f"The database holds several devices, choose one of: {', '.join(devices)}")
+                device = devices[0] if devices else ''
+            conditions.append("device = ?")
+            params.append(device)
+        elif device is not None:
+            raise ValueError("The database holds a single device without addresses, omit the device")
+
+        # The timestamp strings sort like the times they represent
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(datetime.fromtimestamp(start).strftime(DB_TIME_FORMAT))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(datetime.fromtimestamp(end).strftime(DB_TIME_FORMAT))
+        query = f"SELECT timestamp, {', '.join(fields)} FROM readings"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Readings are inserted in time order
+        cursor = db.execute(query + " ORDER BY rowid", params)
+
+        found = False
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            found = True
+            timestamps, *columns = zip(*rows)
+            chunk = {'t': local_times(timestamps)}
+            for field, values in zip(fields, columns):
+                chunk[field] = np.array(values, dtype=column_dtype(field))
+            yield chunk
+        if not found:
+            yield empty_chunk(['t', *fields])
+    finally:
+        db.close()
+
+
+def resample(chunks, interval, how='mean'):
+    """
+    Aggregate chunks into one row per interval seconds, timed at the start
+    of the interval, dropping 'seq'. The interval still open at the end of
+    a chunk is carried over as a single aggregated row with its row count,
+    so bins spanning many chunks neither split nor grow memory use.
+
+    Args:
+        chunks (iterable): chunks as yielded by iter_store or iter_database
+        interval (float): bin width in seconds
+        how (str): 'mean', 'min', 'max', 'first' or 'last' of every bin
+    """
+    if how not in RESAMPLE_METHODS:
+        raise ValueError(f"Resample method must be one of {', '.join(RESAMPLE_METHODS)}")
+    carry = None
+    columns = None
+    for chunk in chunks:
+        chunk = {name: values for name, values in chunk.items() if name != 'seq'}
+        columns = list(chunk)
+        weights = np.ones(len(chunk['t']))
+        if carry is not None:
+            carry, carry_weight = carry
+            chunk = {name: np.concatenate([carry[name], chunk[name]]) for name in columns}
+            weights = np.r_[carry_weight, weights]
+        if not len(weights):
+            continue
+        bins = np.floor(chunk['t'] / interval)
+        # The last bin may continue in the next chunk
+        last_start = int(np.searchsorted(bins, bins[-1], side='left'))
+        head = {name: values[:last_start] for name, values in chunk.items()}
+        tail = {name: values[last_start:] for name, values in chunk.items()}
+        carry = aggregate(tail, bins[last_start:], weights[last_start:], interval, how, partial=True), \
+            weights[last_start:].sum()
+        if last_start:
+            yield aggregate(head, bins[:last_start], weights[:last_start], interval, how)
+    if carry is not None:
+        tail, weight = carry
+        yield aggregate(tail, np.floor(tail['t'] / interval), np.array([weight]), interval, how)
+    elif columns is not None:
+        yield empty_chunk(columns)
+
+
+def aggregate(chunk, bins, weights, interval, how, partial=False):
+    """
+    Returns one row per run of equal bins; rows are weighted by the number
+    of samples they stand for. A partial result is aggregated again later,
+    so it keeps the time of the bin's first row and float64 values.
+    """
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], len(bins)]
+    result = {'t': chunk['t'][starts] if partial else bins[starts] * interval}
+    for name, values in chunk.items():
+        if name == 't':
+            continue
+        if how == 'mean':
+            sums = np.add.reduceat(values.astype(np.float64) * weights, starts)
+            aggregated = sums / np.add.reduceat(weights, starts)
+        elif how == 'min':
+            aggregated = np.minimum.reduceat(values, starts)
+        elif how == 'max':
+            aggregated = np.maximum.reduceat(values, starts)
+        elif how == 'first':
+            aggregated = values[starts]
+        else:
+            aggregated = values[ends - 1]
+        result[name] = aggregated if partial else aggregated.astype(column_dtype(name))
+    return result
+
+
+def records(chunk):
+    # Chunk columns as one structured array of fixed-width records
+    table = np.empty(len(chunk['t']), dtype=[(name, column_dtype(name)) for name in chunk])
+    for name, values in chunk.items():
+        table[name] = values
+    return table
+
+
+def write_csv(chunks, f):
+    """
+    Write chunks as CSV with a header row to the text file f; returns the number of rows
+    """
+    rows = 0
+    header = False
+    for chunk in chunks:
+        columns = list(chunk)
+        if not header:
+            f.write(','.join(columns) + '\n')
+            header = True
+        count = len(chunk['t'])
+        if not count:
+            continue
+        # One C-level format of the whole chunk is several times faster than np.savetxt's row loop
+        row = ','.join('%.3f' if name == 't' else '%d' if name == 'seq' else '%.7g' for name in columns) + '\n'
+        values = zip(*(chunk[name].tolist() for name in columns))
+        f.write((row * count) % tuple(chain.from_iterable(values)))
+        rows += count
+    return rows
+
+
+def npy_header(dtype, rows):
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (rows,)})
+    # Magic, version 1.0 and header length, then the header padded with spaces up to a newline
+    prefix = b'\x93NUMPY\x01\x00' + (NPY_HEADER_BYTES - 10).to_bytes(2, 'little')
+    return prefix + header.ljust(NPY_HEADER_BYTES - 11).encode('latin1') + b'\n'
+
+
+def write_npy(chunks, path):
+    """
+    Write chunks as one structured array in a .npy file, readable with
+    np.load(path, mmap_mode='r'); returns the number of rows
+    """
+    rows = 0
+    dtype = None
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            table = records(chunk)
+            if dtype is None:
+                dtype = table.dtype
+                f.write(npy_header(dtype, 0))
+            table.tofile(f)
+            rows += len(table)
+        # The row count is only known at the end
+        f.seek(0)
+        f.write(npy_header(dtype, rows))
+    return rows
+
+
+def write_npz(chunks, path):
+    """
+    Write every column as its own array in a .npz file, as numpy.savez
+    would; returns the number of rows
+    """
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        files = {}
+        rows = 0
+        for chunk in chunks:
+            for name, values in chunk.items():
+                if name not in files:
+                    files[name] = open(os.path.join(temp_dir, name + '.raw'), 'wb')
+                values.astype(column_dtype(name)).tofile(files[name])
+            rows += len(chunk['t'])
+        for f in files.values():
+            f.close()
+
+        with zipfile.ZipFile(path, 'w', allowZip64=True) as archive:
+            for name in files:
+                with archive.open(name + '.npy', 'w', force_zip64=True) as member:
+                    member.write(npy_header(column_dtype(name), rows))
+                    with open(os.path.join(temp_dir, name + '.raw'), 'rb') as raw:
+                        shutil.copyfileobj(raw, member, 2 ** 20)
+        return rows
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def write_binary(chunks, path):
+    """
+    Write chunks in the compact binary format: BINARY_MAGIC, a JSON line
+    describing the little-endian record layout, then one fixed-width record
+    per row; returns the number of rows
+    """
+    rows = 0
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            table = records(chunk)
+            if f.tell() == 0:
+                f.write(BINARY_MAGIC)
+                layout = [[name, table.dtype[name].str] for name in table.dtype.names]
+                f.write(json.dumps({'columns': layout}).encode() + b'\n')
+            table.tofile(f)
+            rows += len(table)
+    return rows
+
+
+def read_binary(path):
+    """
+    Returns the records of a compact binary file as a read-only memory-mapped
+    structured array
+    """
+    with open(path, 'rb') as f:
+        if f.readline() != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a sensor export")
+        layout = json.loads(f.readline())
+        offset = f.tell()
+    dtype = np.dtype([(name, kind) for name, kind in layout['columns']])
+    rows = (os.path.getsize(path) - offset) // dtype.itemsize
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+
+def export(chunks, path, fmt=None):
+    """
+    Write chunks to path, '-' meaning CSV on standard output, in fmt ('csv',
+    'npy', 'npz' or 'bin') or the format of the file extension; returns the
+    number of rows
+    """
+    if path == '-':
+        return write_csv(chunks, sys.stdout)
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt == 'csv':
+        with open(path, 'w', newline='') as f:
+            return write_csv(chunks, f)
+    if fmt == 'npy':
+        return write_npy(chunks, path)
+    if fmt == 'npz':
+        return write_npz(chunks, path)
+    if fmt == 'bin':
+        return write_binary(chunks, path)
+    raise ValueError(f"Unknown export format for {path}, use one of: {', '.join(FORMATS.values())}")
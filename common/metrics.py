@@ -0,0 +1,201 @@
+import bisect
+import math
+import time
+from collections import deque
+from threading import Lock
+
+# Histogram bucket upper bounds in milliseconds: 0.01 ms .. ~100 s, 10 per decade
+BUCKETS_MS = [10 ** (exponent / 10) for exponent in range(-20, 51)]
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. Adding a value is a binary search and an
+    increment, so it can be updated on every sample without growing memory.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value_ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.total += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-th percentile (0-100)
+        """
+        if not self.total:
+            return 0.0
+        rank = math.ceil(self.total * q / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS_MS[index], self.max) if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.total,
+            'mean_ms': round(self.sum / self.total, 3) if self.total else 0.0,
+            'p50_ms': round(self.percentile(50), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'max_ms': round(self.max, 3),
+        }
+
+
+class ServerMetrics:
+    """
+    Sample numbering and request/sensor timing shared by the Flask servers.
+
+    Every sensor read gets a sequence number and a monotonic acquisition
+    time, so clients can detect dropped or repeated samples and compute how
+    old a sample is without relying on synchronised clocks.
+    """
+
+    def __init__(self, rate_window=10.0):
+        self.lock = Lock()
+        self.started = time.monotonic()
+        self.rate_window = rate_window
+        self.request_times = deque()
+        self.requests_total = 0
+        self.in_flight = 0
+        self.seq = 0
+        self.sensor_read = Histogram()
+        # Callable returning the work waiting to be served, if the server has a queue
+        self.queue_depth = None
+
+    def read(self, read_sensor):
+        """
+        Calls read_sensor() and returns (result, seq, acquired) where acquired
+        is the time.monotonic() value taken when the read finished
+        """
+        started = time.monotonic()
+        result = read_sensor()
+        acquired = time.monotonic()
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            self.sensor_read.add((acquired - started) * 1000)
+        return result, seq, acquired
+
+    def stamp(self, seq, acquired):
+        # Fields added to every sample response
+        return {
+            'seq': seq,
+            'monotonic': acquired,
+            'age': time.monotonic() - acquired,
+        }
+
+    def request_started(self):
+        now = time.monotonic()
+        with self.lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.request_times.append(now)
+            while self.request_times and self.request_times[0] < now - self.rate_window:
+                self.request_times.popleft()
+
+    def request_finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.request_times and self.request_times[0] < now - self.rate_window:
+                self.request_times.popleft()
+            window = min(self.rate_window, now - self.started) or 1.0
+            snapshot = {
+                'uptime': round(now - self.started, 3),
+                'requests_total': self.requests_total,
+                'request_rate': round(len(self.request_times) / window, 3),
+                'in_flight': self.in_flight,
+                'samples_total': self.seq,
+                'cpu_time': round(time.process_time(), 6),
+                'sensor_read': self.sensor_read.summary(),
+            }
+            if self.queue_depth is not None:
+                snapshot['queue_depth'] = self.queue_depth()
+            return snapshot
+
+
+def register_metrics(app, metrics):
+    """
+    Count requests of a Flask app in metrics and expose them on /metrics
+    """
+    @app.before_request
+    def count_request():
+        metrics.request_started()
+
+    @app.teardown_request
+    def finish_request(exc):
+        metrics.request_finished()
+
+    @app.route('/metrics')
+    def get_metrics():
+        return metrics.snapshot()
+
+
+class StreamStats:
+    """
+    Client-side statistics of one polled stream: fetch duration, JSON parse
+    time, sensor-to-screen latency and dropped/duplicate sample counts
+    derived from the server sequence numbers.
+    """
+
+    def __init__(self):
+        self.fetch = Histogram()
+        self.parse = Histogram()
+        self.latency = Histogram()
+        self.last_seq = None
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.recovered = 0
+
+    def add_sample(self, seq, fetch_s, parse_s):
+        """
+        Record a received sample. Returns False if it repeats an already
+        seen sequence number.
+        """
+        self.fetch.add(fetch_s * 1000)
+        self.parse.add(parse_s * 1000)
+        self.received += 1
+        if self.last_seq is not None and seq is not None:
+            if seq <= self.last_seq:
+                # A restarted server starts counting from 1 again
+                if seq != 1 or self.last_seq == 1:
+                    self.duplicates += 1
+                    return False
+            else:
+                self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        return True
+
+    def add_recovered(self, count):
+        # Missed samples fetched later from the server history are not lost
+        self.recovered += count
+        self.dropped = max(self.dropped - count, 0)
+
+    def add_latency(self, age_s, fetch_s, since_received_s):
+        """
+        Sensor-to-screen latency: the sample age reported by the server, half
+        the request round trip, and the time from receipt until it was shown
+        """
+        self.latency.add((age_s + fetch_s / 2 + since_received_s) * 1000)
+
+    def overlay_text(self):
+        fetch = self.fetch.summary()
+        latency = self.latency.summary()
+        return (f"latency p50 {latency['p50_ms']:.1f} ms  p99 {latency['p99_ms']:.1f} ms | "
+                f"fetch p50 {fetch['p50_ms']:.1f} ms  p99 {fetch['p99_ms']:.1f} ms | "
+                f"parse p50 {self.parse.percentile(50):.2f} ms | "
+                f"samples {self.received}  dropped {self.dropped}  recovered {self.recovered}  "
+                f"duplicate {self.duplicates}")
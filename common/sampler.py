@@ -0,0 +1,116 @@
+import time
+from collections import deque
+from itertools import islice
+from threading import Thread, Event, Lock
+
+
+class Sampler:
+    """
+    Reads a sensor in a background thread at a fixed interval and keeps the
+    newest sample in memory, so request handlers never wait for hardware.
+
+    Samples are stored as (values, seq, acquired) tuples as returned by
+    ServerMetrics.read. Replacing the tuple is atomic, so readers need no lock.
+    The most recent samples are also kept in a history ring, so clients can
+    fetch the ones they missed during a disconnect.
+    """
+
+    def __init__(self, metrics, read_sensor, interval, max_age, history_size=0, on_sample=None):
+        """
+        Args:
+            metrics (ServerMetrics): numbers and times the reads
+            read_sensor (callable): returns the values of one sensor read
+            interval (float): seconds between background reads
+            max_age (float): oldest sample in seconds latest() may return
+                before it falls back to reading the sensor itself
+            history_size (int): number of recent samples kept for since()
+            on_sample (callable): called with every new sample, one at a
+                time and in order
+        """
+        self.metrics = metrics
+        self.read_sensor = read_sensor
+        self.interval = interval
+        self.max_age = max_age
+        self.sample = None
+        self.history = deque(maxlen=history_size)
+        self.on_sample = on_sample
+        self.history_lock = Lock()
+        self.read_lock = Lock()
+        # Requests waiting for read_lock because the cached sample was stale
+        self.waiting = 0
+        self.waiting_lock = Lock()
+        self.stop_event = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def refresh(self):
+        # Serialise reads so a stalled refresher and a request never read the bus twice
+        with self.read_lock:
+            self.store(self.metrics.read(self.read_sensor))
+        return self.sample
+
+    def store(self, sample):
+        # Only called with read_lock held
+        self.sample = sample
+        with self.history_lock:
+            self.history.append(sample)
+        if self.on_sample is not None:
+            self.on_sample(sample)
+
+    def run(self):
+        next_time = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reading sensor: {e}")
+            next_time += self.interval
+            # Skip missed slots instead of reading in a burst after a stall
+            next_time = max(next_time, time.monotonic())
+            self.stop_event.wait(next_time - time.monotonic())
+
+    def latest(self):
+        """
+        Returns the newest (values, seq, acquired) sample, reading the sensor
+        directly if there is none yet or it is older than max_age
+        """
+        sample = self.sample
+        if self.is_stale(sample):
+            with self.waiting_lock:
+                self.waiting += 1
+            with self.read_lock:
+                with self.waiting_lock:
+                    self.waiting -= 1
+                # Another request may have refreshed it while we waited
+                sample = self.sample
+                if self.is_stale(sample):
+                    sample = self.metrics.read(self.read_sensor)
+                    self.store(sample)
+        return sample
+
+    def queue_depth(self):
+        # Requests queued behind a sensor read, as reported by /metrics
+        return self.waiting
+
+    def is_stale(self, sample):
+        return sample is None or time.monotonic() - sample[2] > self.max_age
+
+    def since(self, seq, limit):
+        """
+        Returns up to limit samples from the history with a sequence number
+        greater than seq, oldest first, and the oldest sequence number still
+        held (None if the history is empty)
+        """
+        with self.history_lock:
+            if not self.history:
+                return [], None
+            # Only this sampler reads through its metrics, so sequence numbers are consecutive
+            first = self.history[0][1]
+            start = max(seq - first + 1, 0)
+            return list(islice(self.history, start, start + limit)), first
@@ -0,0 +1,33 @@
+# Z acceleration in g the Sense HAT reads at rest; X and Y read 0
+REST_Z = 0.978
+
+# Upper PGA bound (g), description and colour of every intensity level
+INTENSITY_LEVELS = [
+    (0.015, "No Seismic Activity", "lightblue"),
+    (0.022, "Micro Seismic Vibrations (1-2 points)", "green"),
+    (0.05, "Weak Earthquake (3-4 points)", "yellow"),
+    (0.1, "Moderate Earthquake (5 points)", "orange"),
+    (0.2, "Very Strong Earthquake (7 points)", "red"),
+    (0.4, "Destructive Earthquake (8 points)", "darkred"),
+    (float('inf'), "Catastrophic Earthquake (9+ points)", "purple"),
+]
+
+
+def pga(x, y, z):
+    """
+    Returns the peak ground acceleration in g of acceleration values or
+    arrays: the largest deviation from rest on any axis
+    """
+    # NumPy is only needed once samples arrive, not to import the levels
+    import numpy as np
+
+    return np.maximum(np.maximum(np.abs(x), np.abs(y)), np.abs(np.subtract(z, REST_Z)))
+
+
+def intensity_level(pga):
+    """
+    Returns the index of the INTENSITY_LEVELS entry of a PGA value or array
+    """
+    import numpy as np
+
+    return np.searchsorted([bound for bound, _, _ in INTENSITY_LEVELS], pga, side='right')
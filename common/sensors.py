@@ -0,0 +1,130 @@
+import math
+import os
+import random
+import time
+
+# CPU temperature of a Raspberry Pi in millidegrees Celsius
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+
+
+class SimulatedSenseHat:
+    """
+    Stand-in for sense_hat.SenseHat used to run the servers off-device.
+
+    Readings follow slow drifts plus noise around typical indoor values,
+    and every call sleeps for roughly the time the real I2C read takes on
+    a Raspberry Pi, so request timings stay comparable.
+    """
+
+    # Approximate read times of the real sensors in seconds
+    READ_DELAY = {
+        'accelerometer': 0.001,
+        'orientation': 0.002,
+        'humidity': 0.004,
+        'pressure': 0.004,
+    }
+
+    # Room temperature in °C, and the share of the CPU's excess heat the sensors pick up
+    ROOM_TEMPERATURE = 22.0
+    CPU_HEATING = 0.4
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.low_light = False
+        # LED matrix contents as 64 [r, g, b] lists, and the number of frames written to it
+        self.pixels = [[0, 0, 0] for _ in range(64)]
+        self.frames = 0
+
+    def _elapsed(self, kind):
+        time.sleep(self.READ_DELAY[kind])
+        return time.monotonic() - self.started
+
+    def get_accelerometer_raw(self):
+        self._elapsed('accelerometer')
+        return {
+            'x': random.gauss(0.0, 0.004),
+            'y': random.gauss(0.0, 0.004),
+            'z': random.gauss(0.978, 0.004),
+        }
+
+    def get_orientation(self):
+        t = self._elapsed('orientation')
+        return {
+            'pitch': (10 * math.sin(t / 7)) % 360,
+            'roll': (15 * math.sin(t / 5)) % 360,
+            'yaw': (t * 6) % 360,
+        }
+
+    def _room_temperature(self, t):
+        return self.ROOM_TEMPERATURE + 0.5 * math.sin(t / 300)
+
+    def _cpu_temperature(self, t):
+        # Load changes move the CPU temperature much faster than the room's
+        return 50.0 + 5.0 * math.sin(t / 40)
+
+    def _sensor_temperature(self, t):
+        room = self._room_temperature(t)
+        return room + self.CPU_HEATING * (self._cpu_temperature(t) - room)
+
+    def get_temperature_from_humidity(self):
+        t = self._elapsed('humidity')
+        return self._sensor_temperature(t) + 0.5 + random.gauss(0.0, 0.05)
+
+    def get_temperature_from_pressure(self):
+        t = self._elapsed('pressure')
+        return self._sensor_temperature(t) - 0.5 + random.gauss(0.0, 0.05)
+
+    def get_cpu_temperature(self):
+        # Not part of the SenseHat API; stands in for the sysfs thermal zone
+        t = time.monotonic() - self.started
+        return round(self._cpu_temperature(t) + random.gauss(0.0, 0.5), 1)
+
+    def get_humidity(self):
+        t = self._elapsed('humidity')
+        return 45.0 + 2.0 * math.sin(t / 600) + random.gauss(0.0, 0.1)
+
+    def get_pressure(self):
+        t = self._elapsed('pressure')
+        return 1013.0 + 1.5 * math.sin(t / 900) + random.gauss(0.0, 0.05)
+
+    def set_pixels(self, pixel_list):
+        if len(pixel_list) != 64:
+            raise ValueError('Pixel lists must have 64 elements')
+        self.pixels = [list(pixel) for pixel in pixel_list]
+        self.frames += 1
+
+    def get_pixels(self):
+        return [list(pixel) for pixel in self.pixels]
+
+    def clear(self, *colour):
+        colour = list(colour[0] if len(colour) == 1 else colour or (0, 0, 0))
+        self.set_pixels([colour] * 64)
+
+
+def create_sense():
+    """
+    Returns a SenseHat, or a SimulatedSenseHat when the SENSEHAT_SIMULATE
+    environment variable is set to a non-empty value other than 0
+    """
+    if os.environ.get('SENSEHAT_SIMULATE', '0') not in ('', '0'):
+        return SimulatedSenseHat()
+    from sense_hat import SenseHat
+    return SenseHat()
+
+
+def cpu_thermometer(sense, path=THERMAL_ZONE):
+    """
+    Returns a function reading the CPU temperature in °C from the sysfs
+    thermal zone at path, or from a SimulatedSenseHat. Returns None if the
+    thermal zone does not exist.
+    """
+    if isinstance(sense, SimulatedSenseHat):
+        return sense.get_cpu_temperature
+    if not os.path.exists(path):
+        return None
+
+    def read():
+        with open(path) as f:
+            return int(f.read()) / 1000
+
+    return read
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import time
+from flask import Response, abort, jsonify, request
+
+# Fastest rate a /stream client may ask for
+MIN_STREAM_INTERVAL = 0.005
+# Most samples a single /history response may contain
+MAX_HISTORY_SAMPLES = 1000
+
+
+def register_stream(app, read_sample, default_interval):
+    """
+    Add a /stream route that pushes read_sample() as newline-delimited JSON
+    every ?interval= seconds over one long-lived response, so clients get
+    samples without paying for a request per sample
+
+    Args:
+        app (Flask): application to add the route to
+        read_sample (callable): returns one sample as a JSON-serialisable dict
+        default_interval (float): seconds between samples if not requested
+    """
+    @app.route('/stream')
+    def stream():
+        interval = max(float(request.args.get('interval', default_interval)), MIN_STREAM_INTERVAL)
+
+        def generate():
+            next_time = time.monotonic()
+            last_seq = None
+            while True:
+                sample = read_sample()
+                # Cached samples repeat until the sensor is read again
+                if sample.get('seq') is None or sample.get('seq') != last_seq:
+                    last_seq = sample.get('seq')
+                    yield json.dumps(sample) + '\n'
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.monotonic()))
+
+        return Response(generate(), mimetype='application/x-ndjson')
+
+
+def register_history(app, sampler, format_sample):
+    """
+    Add a /history route returning the samples a client missed, so it can
+    catch up in bulk after a disconnect
+
+    Query parameters:
+    since: last sequence number the client has
+    limit: maximum number of samples, from 1 to MAX_HISTORY_SAMPLES
+
+    Returns:
+    JSON object with 'samples', a list of samples in the same format as the
+    live route, and 'first_seq', the oldest sequence number still available
+
+    Args:
+        app (Flask): application to add the route to
+        sampler (Sampler): sampler holding the history
+        format_sample (callable): turns a (values, seq, acquired) sample into
+            a JSON-serialisable dict
+    """
+    @app.route('/history')
+    def history():
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', MAX_HISTORY_SAMPLES, type=int), MAX_HISTORY_SAMPLES)
+        if limit < 1:
+            abort(400, "limit must be at least 1")
+        samples, first_seq = sampler.since(since, limit)
+        return jsonify({'samples': [format_sample(sample) for sample in samples], 'first_seq': first_seq})
+
+
+def run_server(app, port):
+    """
+    Run app on all network interfaces with the serving mode chosen by the
+    SENSEHAT_SERVER environment variable:
+        dev       Werkzeug development server, one thread per request (default)
+        single    Werkzeug development server handling one request at a time
+        waitress  waitress production WSGI server with SENSEHAT_THREADS workers
+    """
+    mode = os.environ.get('SENSEHAT_SERVER', 'dev')
+    if mode == 'waitress':
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=port, threads=int(os.environ.get('SENSEHAT_THREADS', 8)), _quiet=True)
+    elif mode in ('dev', 'single'):
+        # Run server without displaying banner logs
+        cli = sys.modules['flask.cli']
+        cli.show_server_banner = lambda *x: None
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=(mode == 'dev'))
+    else:
+        sys.exit(f"Unknown SENSEHAT_SERVER mode: {mode}")
@@ -0,0 +1,159 @@
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+# Header words: rows written so far, capacity in rows, fields per row, rows written once the
+# append in progress completes
+HEADER = np.dtype('<i8')
+HEADER_WORDS = 4
+
+# Fields of the rings the servers publish their samples to for other
+# processes on the Pi, and the prefix of their shared memory names
+SENSOR_RINGS = {
+    'acceleration': ['t', 'x', 'y', 'z', 'seq'],
+    'tph': ['t', 'temperature', 'humidity', 'pressure', 'seq'],
+}
+SENSOR_RING_PREFIX = 'sensehat_'
+
+
+class SharedRing:
+    """
+    Fixed-size ring of float64 rows in a multiprocessing.shared_memory
+    block, written by one process and read by any number of others.
+
+    The header holds the total number of rows ever written. The writer
+    first announces the count its append will reach, then stores the new
+    rows and only then advances the count, so readers never see a row
+    before it is complete. A reader copies only the rows it asks for and
+    checks the announced count afterwards, dropping any row the writer
+    overwrote or was overwriting meanwhile, so no lock is shared between
+    the processes.
+    """
+
+    def __init__(self, block, fields, owner):
+        self.block = block
+        self.owner = owner
+        self.header = np.ndarray((HEADER_WORDS,), dtype=HEADER, buffer=block.buf)
+        self.capacity = int(self.header[1])
+        self.fields = list(fields) if fields is not None else None
+        self.data = np.ndarray((self.capacity, int(self.header[2])), dtype=np.float64, buffer=block.buf,
+                               offset=HEADER_WORDS * HEADER.itemsize)
+
+    @classmethod
+    def create(cls, fields, capacity, name=None):
+        """
+        Allocate a new ring of capacity rows with one float64 column per field
+        """
+        size = HEADER_WORDS * HEADER.itemsize + capacity * len(fields) * 8
+        block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_WORDS,), dtype=HEADER, buffer=block.buf)
+        header[:] = [0, capacity, len(fields), 0]
+        del header
+        return cls(block, fields, owner=True)
+
+    @classmethod
+    def attach(cls, name, fields=None, track=True):
+        """
+        Open the ring another process created under name
+
+        Python registers every block it opens with the resource tracker of
+        its process tree, which unlinks it when the tree exits. A process
+        started independently of the ring's owner must pass track=False, so
+        exiting does not destroy the owner's ring.
+
+        Raises:
+            ValueError: if fields do not match the ring's columns
+        """
+        block = shared_memory.SharedMemory(name=name)
+        if not track:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        ring = cls(block, fields, owner=False)
+        if fields is not None and len(fields) != ring.data.shape[1]:
+            ring.close()
+            raise ValueError(f"Ring {name} holds {ring.data.shape[1]} fields, not {len(fields)}")
+        return ring
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @property
+    def count(self):
+        # Rows written since the ring was created
+        return int(self.header[0])
+
+    def column(self, field):
+        return self.fields.index(field)
+
+    def append(self, rows):
+        """
+        Write rows, an array of shape (n, fields) or a single row; only one
+        process may write to a ring
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        end = int(self.header[0]) + len(rows)
+        # Rows that would be overwritten within this call are counted but never stored
+        kept = rows[-self.capacity:]
+        # Announce the slots about to change before touching them
+        self.header[3] = end
+        self.data[np.arange(end - len(kept), end) % self.capacity] = kept
+        # Publish the rows only after they are written
+        self.header[0] = end
+
+    def since(self, count, limit=None):
+        """
+        Returns (rows, new count): a copy of the rows written after the
+        first count rows, oldest first and at most the limit newest ones,
+        and the count to pass to the next call
+        """
+        end = int(self.header[0])
+        start = max(count, end - self.capacity, 0)
+        if limit is not None:
+            start = max(start, end - limit)
+        rows = self.data[np.arange(start, end) % self.capacity]
+        # Rows overwritten while they were copied, or still being overwritten, may be torn
+        oldest = int(self.header[3]) - self.capacity
+        if oldest > start:
+            rows = rows[oldest - start:]
+        return rows, end
+
+    def latest(self, limit):
+        return self.since(0, limit)[0]
+
+    def unlink(self):
+        # Remove the name only; the memory stays valid until every process closes it
+        self.block.unlink()
+
+    def close(self):
+        # Views into the block must be released before it can be closed
+        self.header = self.data = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+def publish_sensor_ring(stream, capacity):
+    """
+    Create the ring of a SENSOR_RINGS stream under its well-known name, so
+    any process on the same host can read the server's samples without
+    touching the sensor. A block left behind by a server that was killed
+    is replaced.
+    """
+    name = SENSOR_RING_PREFIX + stream
+    try:
+        return SharedRing.create(SENSOR_RINGS[stream], capacity, name=name)
+    except FileExistsError:
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        return SharedRing.create(SENSOR_RINGS[stream], capacity, name=name)
+
+
+def attach_sensor_ring(stream):
+    """
+    Returns the ring a server publishes a SENSOR_RINGS stream to, or None if
+    it is not running or does not publish it
+    """
+    try:
+        return SharedRing.attach(SENSOR_RING_PREFIX + stream, SENSOR_RINGS[stream], track=False)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,63 @@
+from PySide6.QtGui import QColor, QPalette
+
+
+class LabelState:
+    """
+    Displayed text and style state of a QLabel, touching the widget only
+    when one of them changes.
+
+    Setting a style sheet makes Qt parse it and repolish the widget, one of
+    the most expensive widget operations, so states that only change the
+    text colour switch between palettes built once up front. States that
+    change more than the colour switch to their own style sheet, which is
+    only applied when entering or leaving them.
+    """
+
+    def __init__(self, label, style='', colors=None, styles=None, state=None):
+        """
+        Args:
+            label (QLabel): label to update
+            style (str): style sheet of the label
+            colors (dict): {state: text colour}
+            styles (dict): {state: style sheet replacing style in that state}
+            state (str): initial state
+        """
+        self.label = label
+        self.text = label.text()
+        self.state = None
+        self.style = style
+        self.styles = styles or {}
+        self.sheet = style
+        if style:
+            label.setStyleSheet(style)
+        self.palettes = {}
+        for name, color in (colors or {}).items():
+            palette = QPalette(label.palette())
+            palette.setColor(QPalette.WindowText, QColor(color))
+            self.palettes[name] = palette
+        if state is not None:
+            self.set_state(state)
+
+    def set(self, text, state=None):
+        """
+        Show text, and switch to state unless it is None; returns True if
+        the label changed
+        """
+        changed = False
+        if text != self.text:
+            self.text = text
+            self.label.setText(text)
+            changed = True
+        if state is not None and state != self.state:
+            self.set_state(state)
+            changed = True
+        return changed
+
+    def set_state(self, state):
+        self.state = state
+        sheet = self.styles.get(state, self.style)
+        if sheet != self.sheet:
+            self.sheet = sheet
+            self.label.setStyleSheet(sheet)
+        if state in self.palettes:
+            self.label.setPalette(self.palettes[state])
@@ -0,0 +1,216 @@
+import argparse
+import math
+import os
+import signal
+import sys
+import time
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.seismic import INTENSITY_LEVELS, intensity_level, pga
+from common.sensors import create_sense
+from common.shm_ring import SENSOR_RINGS, attach_sensor_ring
+
+# Frames rendered per second by default
+REFRESH_RATE = 10.0
+# Seconds without a new sample after which a stream is shown as missing, and between attempts to reopen it
+STALE_AFTER = 5.0
+REATTACH_INTERVAL = 1.0
+# Seconds over which the peak ground acceleration is held
+SEISMIC_WINDOW = 2.0
+# Tilt in degrees per LED of the tilt indicator
+TILT_STEP = 10.0
+
+# Field, lower and upper bound and colour of the bars in columns 0-2
+TPH_BARS = [
+    ('temperature', 10.0, 40.0, (190, 60, 0)),
+    ('humidity', 0.0, 100.0, (0, 90, 190)),
+    ('pressure', 970.0, 1050.0, (120, 0, 190)),
+]
+# Tilt indicator in columns 3-7 of rows 0-4, seismic intensity in columns 3-7 of rows 6-7
+TILT_CENTRE = (5, 2)
+SEISMIC_ROWS = (6, 7)
+SEISMIC_COLUMNS = range(3, 8)
+
+BLACK = (0, 0, 0)
+DIM = (30, 30, 30)
+WHITE = (190, 190, 190)
+GREEN = (0, 190, 0)
+# Marks a stream whose server does not publish
+MISSING = (60, 0, 0)
+# LED colour of every INTENSITY_LEVELS colour name
+INTENSITY_RGB = {
+    'lightblue': (0, 40, 90),
+    'green': (0, 160, 0),
+    'yellow': (190, 160, 0),
+    'orange': (220, 90, 0),
+    'red': (220, 0, 0),
+    'darkred': (110, 0, 0),
+    'purple': (140, 0, 170),
+}
+
+
+class Dashboard:
+    """
+    Renders the latest sensor state on the 8x8 LED matrix from the shared
+    memory rings the accelerometer and TPH servers publish to, so the
+    display never reads a sensor itself and needs no network client.
+
+    Frames are built in memory at a fixed rate and written with a single
+    set_pixels() call, and only when they differ from the frame on the
+    matrix, so a steady reading costs no LED writes at all.
+    """
+
+    def __init__(self, sense):
+        self.sense = sense
+        self.rings = {}
+        self.counts = {}
+        self.attempted = {}
+        # (time, peak ground acceleration) of the recently read acceleration batches
+        self.peaks = deque()
+        self.shown = None
+        self.rendered = 0
+        self.written = 0
+
+    def ring(self, stream, now):
+        """
+        Returns the ring of a stream, opening it again at most every
+        REATTACH_INTERVAL seconds while it is missing, e.g. until its server
+        starts or after it restarted with a new ring
+        """
+        ring = self.rings.get(stream)
+        if ring is None and now - self.attempted.get(stream, -REATTACH_INTERVAL) >= REATTACH_INTERVAL:
+            self.attempted[stream] = now
+            ring = attach_sensor_ring(stream)
+            if ring is not None:
+                self.rings[stream] = ring
+                self.counts[stream] = 0
+        return ring
+
+    def read(self, stream, now, limit):
+        """
+        Returns the rows of a stream published since the last call, at most
+        limit of them, or None if the stream is missing or went stale
+        """
+        ring = self.ring(stream, now)
+        if ring is None:
+            return None
+        rows, self.counts[stream] = ring.since(self.counts[stream], limit)
+        newest = ring.latest(1)
+        if not len(newest) or now - newest[-1][0] > STALE_AFTER:
+            # A restarted server publishes to a new block under the same name
+            ring.close()
+            del self.rings[stream]
+            return None
+        return rows
+
+    def draw_bars(self, frame, now):
+        if self.read('tph', now, 1) is None:
+            for column in range(len(TPH_BARS)):
+                frame[7 * 8 + column] = MISSING
+            return
+        ring = self.rings['tph']
+        reading = ring.latest(1)[-1]
+        for column, (field, low, high, colour) in enumerate(TPH_BARS):
+            level = min(max((reading[ring.column(field)] - low) / (high - low), 0.0), 1.0) * 8
+            for height in range(8):
+                # The top LED of a bar shows the fraction of its step by brightness
+                share = min(max(level - height, 0.0), 1.0)
+                if share > 0:
+                    frame[(7 - height) * 8 + column] = tuple(int(c * share) for c in colour)
+
+    def draw_acceleration(self, frame, now):
+        # Enough rows for SEISMIC_WINDOW seconds at the fastest sample rate
+        rows = self.read('acceleration', now, 1000)
+        if rows is None:
+            self.peaks.clear()
+            frame[TILT_CENTRE[1] * 8 + TILT_CENTRE[0]] = MISSING
+            for column in SEISMIC_COLUMNS:
+                frame[SEISMIC_ROWS[-1] * 8 + column] = MISSING
+            return
+        if len(rows):
+            self.peaks.append((rows[-1, 0], pga(rows[:, 1], rows[:, 2], rows[:, 3]).max()))
+        while self.peaks and now - self.peaks[0][0] > SEISMIC_WINDOW:
+            self.peaks.popleft()
+        peak = max((value for _, value in self.peaks), default=0.0)
+        colour = INTENSITY_RGB[INTENSITY_LEVELS[intensity_level(peak)][2]]
+        for row in SEISMIC_ROWS:
+            for column in SEISMIC_COLUMNS:
+                frame[row * 8 + column] = colour
+
+        # Tilt from the direction of gravity in the latest sample
+        _, x, y, z = self.rings['acceleration'].latest(1)[-1][:4]
+        roll = math.degrees(math.atan2(y, z))
+        pitch = math.degrees(math.atan2(-x, math.hypot(y, z)))
+        dx = min(max(round(roll / TILT_STEP), -2), 2)
+        dy = min(max(round(pitch / TILT_STEP), -2), 2)
+        frame[TILT_CENTRE[1] * 8 + TILT_CENTRE[0]] = DIM
+        frame[(TILT_CENTRE[1] + dy) * 8 + TILT_CENTRE[0] + dx] = GREEN if dx == dy == 0 else WHITE
+
+    def render(self, now):
+        """
+        Returns the frame for now as a list of 64 (r, g, b) tuples, row by row
+        """
+        frame = [BLACK] * 64
+        self.draw_bars(frame, now)
+        self.draw_acceleration(frame, now)
+        return frame
+
+    def update(self):
+        # Write the frame only if any pixel changed, in one call
+        frame = self.render(time.monotonic())
+        self.rendered += 1
+        if frame != self.shown:
+            self.sense.set_pixels(frame)
+            self.shown = frame
+            self.written += 1
+
+    def run(self, rate, duration=None):
+        """
+        Update the matrix rate times per second until interrupted or for
+        duration seconds
+        """
+        interval = 1.0 / rate
+        started = next_time = time.monotonic()
+        while duration is None or time.monotonic() - started < duration:
+            self.update()
+            next_time += interval
+            # Skip missed frames instead of rendering in a burst after a stall
+            next_time = max(next_time, time.monotonic())
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+        self.sense.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show live sensor state on the LED matrix from the shared rings of the local servers, "
+                    f"which must run with SENSEHAT_SHARED_RINGS=1 ({', '.join(SENSOR_RINGS)})")
+    parser.add_argument('--rate', type=float, default=REFRESH_RATE,
+                        help=f"frames per second (default: {REFRESH_RATE:g})")
+    parser.add_argument('--duration', type=float, help="seconds to run for (default: until interrupted)")
+    parser.add_argument('--low-light', action='store_true', help="dim the matrix")
+    args = parser.parse_args()
+
+    sense = create_sense()
+    sense.low_light = args.low_light
+    dashboard = Dashboard(sense)
+    # Stopping the service must clear the matrix too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    started = time.monotonic()
+    try:
+        dashboard.run(args.rate, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.close()
+        elapsed = time.monotonic() - started
+        print(f"Rendered {dashboard.rendered} frames in {elapsed:.0f} s, wrote {dashboard.written} to the matrix")
+
+
+if __name__ == '__main__':
+    main()
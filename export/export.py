@@ -0,0 +1,73 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.export import RESAMPLE_METHODS, export, iter_database, iter_store, resample
+
+
+def parse_time(value):
+    """
+    Returns a Unix timestamp from a timestamp, a local ISO 8601 time such as
+    2024-05-01T12:00, or a time relative to now such as -2h (s, m, h or d)
+    """
+    if value is None:
+        return None
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if value.startswith('-') and value[-1] in units:
+        return time.time() - float(value[1:-1]) * units[value[-1]]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export a time range of stored sensor data to CSV, .npy, .npz or compact binary",
+        epilog="examples:\n"
+               "  python export/export.py acceleration --start=-1h -o acceleration.npy\n"
+               "  python export/export.py tph --db environment_data.db --resample 60 -o tph.csv",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('stream', help="stream stored by the sensor logger, e.g. acceleration, or tph with --db")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file; the extension selects the format (default: CSV on standard output)")
+    parser.add_argument('--format', choices=['csv', 'npy', 'npz', 'bin'], help="output format, overrides the extension")
+    parser.add_argument('--root', default='sensor_data',
+                        help="storage directory of the sensor logger (default: sensor_data)")
+    parser.add_argument('--db', help="read TPH readings from this TPH client database instead of the logger storage")
+    parser.add_argument('--device', help="device address to export from a database holding several devices")
+    parser.add_argument('--start',
+                        help="first time to export: Unix timestamp, local ISO time, or relative as in --start=-2h")
+    parser.add_argument('--end', help="time to stop before, in the same forms as --start")
+    parser.add_argument('--fields', nargs='+', help="fields to export (default: all)")
+    parser.add_argument('--resample', type=float, metavar='SECONDS', help="aggregate into one row per interval")
+    parser.add_argument('--how', choices=RESAMPLE_METHODS, default='mean',
+                        help="aggregate of every resampled interval (default: mean)")
+    args = parser.parse_args()
+
+    try:
+        start, end = parse_time(args.start), parse_time(args.end)
+        if args.db:
+            if args.stream != 'tph':
+                parser.error("the TPH client database only holds the tph stream")
+            chunks = iter_database(args.db, start, end, device=args.device, fields=args.fields)
+        else:
+            chunks = iter_store(args.root, args.stream, start, end, fields=args.fields)
+        if args.resample:
+            chunks = resample(chunks, args.resample, args.how)
+        started = time.monotonic()
+        rows = export(chunks, args.output, args.format)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    except sqlite3.Error as e:
+        sys.exit(f"Error: cannot read {args.db}: {e}")
+    if args.output != '-':
+        print(f"Exported {rows} rows to {args.output} in {time.monotonic() - started:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
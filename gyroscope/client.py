@@ -1,22 +1,48 @@
 import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
-import requests
+from pygame.locals import DOUBLEBUF, OPENGL
+# Only the GL names in use; GLU, requests and fonts are loaded on first use
+from OpenGL.GL import (glBegin, glBlendFunc, glClear, glClearColor, glClearDepth, glColor3fv, glDepthFunc,
+                       glDisable, glDrawPixels, glEnable, glEnd, glHint, glLight, glLightfv, glLoadIdentity,
+                       glMatrixMode, glNormal3fv, glPopMatrix, glPushMatrix, glRotatef, glShadeModel,
+                       glTranslatef, glVertex3fv, glWindowPos2d,
+                       GL_AMBIENT, GL_BLEND, GL_COLOR_BUFFER_BIT, GL_COLOR_MATERIAL, GL_DEPTH_BUFFER_BIT,
+                       GL_DEPTH_TEST, GL_DIFFUSE, GL_LESS, GL_LIGHT0, GL_LIGHTING, GL_LINE_SMOOTH,
+                       GL_LINE_SMOOTH_HINT, GL_MODELVIEW, GL_MULTISAMPLE, GL_NICEST, GL_ONE_MINUS_SRC_ALPHA,
+                       GL_PERSPECTIVE_CORRECTION_HINT, GL_POLYGON_SMOOTH, GL_POLYGON_SMOOTH_HINT, GL_POSITION,
+                       GL_PROJECTION, GL_QUADS, GL_RGBA, GL_SMOOTH, GL_SRC_ALPHA, GL_UNSIGNED_BYTE)
 from threading import Thread
 import queue
 import time
 import numpy as np
 import os
 from collections import deque
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.adaptive import AdaptiveRate
+from common.devices import device_hosts
+from common.metrics import StreamStats
+
 # Load variables from .env file
 load_dotenv()
 # Parameters for data storage and smoothing
 current_quaternion = np.array([1, 0, 0, 0])
 quaternion_buffer = deque(maxlen=10)  # Buffer for quaternion smoothing
 data_queue = queue.Queue()
+# Latency statistics and (received, age, fetch duration) of the newest sample
+stats = StreamStats()
+latest_sample = None
+
+# Seconds between requests while the board turns, when it is still and after errors
+MIN_POLL_INTERVAL = 0.008
+MAX_POLL_INTERVAL = 0.1
+ERROR_POLL_INTERVAL = 1.0
+# Angular speeds in degrees per second above which the board counts as turning, and below which as still
+TURNING_SPEED = 30.0
+STILL_SPEED = 10.0
+# Request rate, kept at its fastest for 2 s after a turn and halved every second the board is still
+rate = AdaptiveRate(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL, TURNING_SPEED, STILL_SPEED, 2.0, 1.0, ERROR_POLL_INTERVAL)
 
 
 def slerp(q1, q2, t):
@@ -54,12 +80,27 @@ def fetch_orientation_data(server_url):
     Args:
         server_url (str): URL of the orientation data endpoint
     """
-    global current_quaternion
+    global current_quaternion, latest_sample
+    import requests
+
+    previous = None
     while True:
         try:
+            fetch_started = time.monotonic()
             response = requests.get(server_url)
+            received = time.monotonic()
+            rate.link(received - fetch_started, response.status_code != 200)
             if response.status_code == 200:
                 data = response.json()
+                if not stats.add_sample(data.get('seq'), received - fetch_started, time.monotonic() - received):
+                    time.sleep(rate.interval)
+                    continue
+                # Fastest turn about any axis since the previous sample, across the 0/360 wrap
+                if previous is not None and data['monotonic'] > previous['monotonic']:
+                    turned = max(abs((data[axis] - previous[axis] + 180) % 360 - 180)
+                                 for axis in ('pitch', 'roll', 'yaw'))
+                    rate.observe(turned / (data['monotonic'] - previous['monotonic']))
+                previous = data
                 pitch = np.radians(data['yaw'])
                 roll = np.radians(data['pitch'])
                 yaw = np.radians(data['roll'])
@@ -84,11 +125,13 @@ def fetch_orientation_data(server_url):
                         t = i / len(quaternion_buffer)
                         smooth_quaternion = slerp(smooth_quaternion, quaternion_buffer[i], t)
                     current_quaternion = smooth_quaternion
+                    latest_sample = (received, data.get('age', 0.0), received - fetch_started)
 
-            time.sleep(0.008)
+            time.sleep(rate.interval)
         except Exception as e:
             print(f"Error fetching data: {e}")
-            time.sleep(1)
+            rate.link(0.0, True)
+            time.sleep(rate.interval)
 
 
 def draw_cube():
@@ -161,8 +204,18 @@ def draw_cube_geometry():
     glDisable(GL_LIGHTING)
 
 
+def draw_stats_overlay(font, text):
+    """Draw a line of statistics text in the bottom-left corner of the window"""
+    surface = font.render(text, True, (60, 60, 60), (255, 255, 255))
+    pixels = pygame.image.tostring(surface, 'RGBA', True)
+    glWindowPos2d(5, 5)
+    glDrawPixels(surface.get_width(), surface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+
 def init_gl(display):
     """Enhanced OpenGL initialization"""
+    from OpenGL.GLU import gluPerspective
+
     glEnable(GL_DEPTH_TEST)
     glEnable(GL_BLEND)
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
@@ -187,6 +240,12 @@ def init_gl(display):
 
 def main():
     """Main application loop"""
+    # The 3D view follows the first device listed in RASPBERRY_PI_LOCAL_IP
+    hosts = device_hosts()
+    if not hosts:
+        sys.exit("Set RASPBERRY_PI_LOCAL_IP in .env to the address of the Raspberry Pi")
+    server_url = f'http://{hosts[0]}:5002/orientation'
+
     pygame.init()
     display = (1024, 768)
     pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 16)  # MSAA x16
@@ -196,12 +255,14 @@ def main():
     init_gl(display)
     glTranslatef(0.0, 0.0, -9)
 
-    RASPBERRY_PI_IP = os.environ.get("RASPBERRY_PI_LOCAL_IP")
-    server_url = f'http://{RASPBERRY_PI_IP}:5002/orientation'
-    data_thread = Thread(target=fetch_orientation_data, args=(server_url,), daemon=True)
-    data_thread.start()
+    data_thread = None
 
     clock = pygame.time.Clock()
+    # Looking up a system font can take longer than opening the window, so it waits for the first stats update
+    font = None
+    stats_text = "Stats: waiting for data..."
+    stats_updated = time.monotonic()
+    shown_sample = None
 
     while True:
         for event in pygame.event.get():
@@ -211,7 +272,26 @@ def main():
 
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         draw_cube()
+        if font is not None:
+            draw_stats_overlay(font, stats_text)
         pygame.display.flip()
+
+        if data_thread is None:
+            # Start fetching once the first frame is on screen
+            data_thread = Thread(target=fetch_orientation_data, args=(server_url,), daemon=True)
+            data_thread.start()
+
+        # Sensor-to-screen latency of the first frame showing a new sample
+        sample = latest_sample
+        if sample is not None and sample is not shown_sample:
+            received, age, fetch = sample
+            stats.add_latency(age, fetch, time.monotonic() - received)
+            shown_sample = sample
+        if time.monotonic() - stats_updated >= 1:
+            if font is None:
+                font = pygame.font.SysFont('monospace', 14)
+            stats_text = f"{clock.get_fps():.0f} fps | {stats.overlay_text()} | {rate.overlay_text()}"
+            stats_updated = time.monotonic()
         clock.tick(120)
 
 
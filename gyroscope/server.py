@@ -1,15 +1,32 @@
-from sense_hat import SenseHat
 from flask import Flask, jsonify
 from flask_cors import CORS
+import os, sys
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import ServerMetrics, register_metrics
+from common.sensors import create_sense
+from common.serving import register_stream, run_server
+
 app = Flask(__name__)
 app.logger.disabled = True
 log = logging.getLogger('werkzeug')
 log.disabled = True
 
 CORS(app)
-sense = SenseHat()
+sense = create_sense()
+metrics = ServerMetrics()
+register_metrics(app, metrics)
+
+
+def read_orientation():
+    orientation, seq, acquired = metrics.read(sense.get_orientation)
+    return {
+        'pitch': round(orientation['pitch'], 3),
+        'roll': round(orientation['roll'], 3),
+        'yaw': round(orientation['yaw'], 3),
+        **metrics.stamp(seq, acquired)
+    }
 
 
 @app.route('/orientation')
@@ -18,19 +35,18 @@ def get_orientation():
     Retrieve device orientation data from Sense HAT.
 
     Returns:
-    JSON object with pitch, roll, and yaw values rounded to 3 decimal places
+    JSON object with pitch, roll, and yaw values rounded to 3 decimal places,
+    plus the sample sequence number, monotonic acquisition time and age
 
     Note: Data is smoothed for more fluid animation
     """
-    orientation = sense.get_orientation()
     # Smoothing data for more fluid animation
-    return jsonify({
-        'pitch': round(orientation['pitch'], 3),
-        'roll': round(orientation['roll'], 3),
-        'yaw': round(orientation['yaw'], 3)
-    })
+    return jsonify(read_orientation())
+
+
+register_stream(app, read_orientation, default_interval=0.01)
 
 
 if __name__ == '__main__':
     # Run Flask server on all network interfaces, port 5002
-    app.run(host='0.0.0.0', port=5002, debug=False)
\ No newline at end of file
+    run_server(app, 5002)
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from itertools import count
+from threading import Thread, Event, Lock
+import numpy as np
+from flask import Flask, jsonify, request, abort
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.alerts import AlertEngine, load_rules
+from common.colstore import ColumnStore
+from common.metrics import ServerMetrics, register_metrics
+from common.serving import MAX_HISTORY_SAMPLES, run_server
+
+app = Flask(__name__)
+# Disable all Flask logs
+app.logger.disabled = True
+log = logging.getLogger('werkzeug')
+log.disabled = True
+
+metrics = ServerMetrics()
+register_metrics(app, metrics)
+
+# Local server port, stream interval and stored fields of every sensor stream
+STREAMS = {
+    'acceleration': {'port': 5003, 'interval': 0.02, 'fields': ['x', 'y', 'z']},
+    'orientation': {'port': 5002, 'interval': 0.1, 'fields': ['pitch', 'roll', 'yaw']},
+    'tph': {'port': 5001, 'interval': 1.0, 'fields': ['temperature', 'humidity', 'pressure']},
+}
+
+# Most rows a single /range response may contain
+MAX_RANGE_ROWS = 10000
+# Seconds between flushes of buffered rows to disk
+FLUSH_INTERVAL = 5.0
+# Seconds of samples evaluated together by the alert rules of a stream
+ALERT_INTERVAL = 0.1
+# Most recent alert events kept for /alerts
+MAX_ALERT_EVENTS = 1000
+
+stores = {}
+engines = {}
+alert_events = deque(maxlen=MAX_ALERT_EVENTS)
+active_alerts = {}
+alerts_lock = Lock()
+alert_ids = count(1)
+
+
+def fetch_history(base_url, since, until):
+    """
+    Returns the samples with since < seq < until from a server's /history,
+    oldest first; samples that already left the history are skipped
+    """
+    samples = []
+    while since < until - 1:
+        query = urllib.parse.urlencode({'since': since, 'limit': min(until - since - 1, MAX_HISTORY_SAMPLES)})
+        with urllib.request.urlopen(f"{base_url}/history?{query}", timeout=10) as response:
+            chunk = [sample for sample in json.load(response)['samples'] if sample['seq'] < until]
+        if not chunk:
+            break
+        samples.extend(chunk)
+        since = chunk[-1]['seq']
+    return samples
+
+
+def follow_stream(stream, host, stop_event):
+    """
+    Read a server's /stream route and append every sample to the stream's
+    store, reconnecting with a back-off while the server is unavailable.
+    The stream only carries the newest sample at the requested interval, so
+    gaps in the sequence numbers, e.g. from a reconnect, are filled from the
+    server's /history where it has one.
+
+    Args:
+        stream (str): key of STREAMS to log
+        host (str): address of the servers, normally localhost
+        stop_event (Event): set to stop logging
+    """
+    config = STREAMS[stream]
+    store = stores[stream]
+    engine = engines.get(stream)
+    base_url = f"http://{host}:{config['port']}"
+    url = f"{base_url}/stream?interval={config['interval']}"
+    backoff = 1.0
+    batch = []
+    checked = time.monotonic()
+    last_seq = None
+    has_history = True
+
+    def record(sample):
+        nonlocal batch, checked
+        # The server runs on this host, so its sample age is exact
+        acquired = time.time() - sample.get('age', 0.0)
+        values = [sample[field] for field in config['fields']]
+        store.append(acquired, sample.get('seq', 0), values)
+        if engine is not None:
+            batch.append((acquired, *values))
+            if time.monotonic() - checked >= ALERT_INTERVAL:
+                check_alerts(engine, batch)
+                batch = []
+                checked = time.monotonic()
+
+    while not stop_event.is_set():
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                backoff = 1.0
+                for line in response:
+                    sample = json.loads(line)
+                    seq = sample.get('seq')
+                    # A restarted server counts from 1 again, so a smaller seq is not a gap
+                    if has_history and seq is not None and last_seq is not None and seq > last_seq + 1:
+                        try:
+                            for missed in fetch_history(base_url, last_seq, seq):
+                                record(missed)
+                        except urllib.error.HTTPError as e:
+                            if e.code == 404:
+                                # Servers that read on request, like the gyroscope, keep no history
+                                has_history = False
+                            else:
+                                print(f"Error filling {stream} history: {e}")
+                        except Exception as e:
+                            print(f"Error filling {stream} history: {e}")
+                    record(sample)
+                    last_seq = seq
+                    if stop_event.is_set():
+                        break
+        except Exception as e:
+            print(f"Error logging {stream}: {e}")
+            stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def check_alerts(engine, batch):
+    """
+    Evaluate a batch of (time, *values) rows with the stream's alert rules
+    and record the alerts they raise or clear
+    """
+    rows = np.array(batch, dtype=np.float64)
+    events = engine.process(rows[:, 0], {field: rows[:, i] for i, field in enumerate(engine.fields, start=1)})
+    with alerts_lock:
+        for event in events:
+            event['id'] = next(alert_ids)
+            alert_events.append(event)
+            if event['state'] == 'raised':
+                active_alerts[event['rule']] = event
+            else:
+                active_alerts.pop(event['rule'], None)
+            print(f"Alert {event['rule']} {event['state']}: {event['field']} = {event['value']:.3f}")
+
+
+def flush_stores(stop_event):
+    # Bound the data lost on power failure to FLUSH_INTERVAL seconds
+    while not stop_event.wait(FLUSH_INTERVAL):
+        for store in stores.values():
+            store.flush()
+
+
+def queued_rows():
+    return sum(store.pending_rows() for store in stores.values())
+
+
+@app.route('/streams')
+def get_streams():
+    """
+    List the logged streams with their fields and first/last stored times
+    """
+    result = {}
+    for stream, store in stores.items():
+        first, last = store.bounds()
+        result[stream] = {'fields': store.fields, 'first': first, 'last': last}
+    return jsonify(result)
+
+
+@app.route('/range/<stream>')
+def get_range(stream):
+    """
+    Retrieve stored samples of a stream with start <= t < end.
+
+    Query parameters:
+    start, end: Unix timestamps, open-ended if omitted
+    limit: maximum number of rows, 1 to MAX_RANGE_ROWS
+
+    Returns:
+    JSON object with one array per column ('t', 'seq' and the stream fields),
+    'complete', false if the limit cut the range short, and 'next', the start
+    to request the following page with
+    """
+    if stream not in stores:
+        abort(404)
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    limit = min(request.args.get('limit', MAX_RANGE_ROWS, type=int), MAX_RANGE_ROWS)
+    if limit < 1:
+        abort(400, "limit must be at least 1")
+
+    store = stores[stream]
+    columns = {name: [] for name in ['t', 'seq', *store.fields]}
+    rows = 0
+    complete = True
+    for chunk in store.iter_range(start, end, chunk_rows=limit):
+        take = min(len(chunk['t']), limit - rows)
+        for name in columns:
+            columns[name].extend(chunk[name][:take].tolist())
+        rows += take
+        if rows >= limit:
+            # Another chunk or unread rows of this one mean the range continues
+            complete = False
+            break
+    next_start = float(np.nextafter(columns['t'][-1], np.inf)) if columns['t'] else start
+    return jsonify({**columns, 'complete': complete, 'next': next_start})
+
+
+@app.route('/alerts')
+def get_alerts():
+    """
+    Retrieve the active alerts and the recent alert events.
+
+    Query parameters:
+    since: last event id the client has, to only return newer events
+
+    Returns:
+    JSON object with 'active', the raising event of every active alert, and
+    'events', the raised and cleared events after since, oldest first
+    """
+    since = request.args.get('since', 0, type=int)
+    with alerts_lock:
+        return jsonify({'active': list(active_alerts.values()),
+                        'events': [event for event in alert_events if event['id'] > since]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log all sensor streams of the local servers to columnar files")
+    parser.add_argument('--root', default='sensor_data', help="storage directory (default: sensor_data)")
+    parser.add_argument('--host', default='127.0.0.1', help="address of the sensor servers (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=5004, help="port of the range query API (default: 5004)")
+    parser.add_argument('--segment-mb', type=float, default=64, help="rotate segments above this size (default: 64)")
+    parser.add_argument('--segment-minutes', type=float, default=60,
+                        help="rotate segments after this many minutes (default: 60)")
+    parser.add_argument('--retention-mb', type=float, default=None,
+                        help="delete the oldest segments of a stream above this size (default: keep all)")
+    parser.add_argument('--alerts', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alerts.json'),
+                        help="JSON file of alert rules, empty to disable alerts (default: logger/alerts.json)")
+    args = parser.parse_args()
+
+    rules = load_rules(args.alerts) if args.alerts else []
+
+    for stream, config in STREAMS.items():
+        stores[stream] = ColumnStore(
+            args.root, stream, config['fields'],
+            segment_bytes=int(args.segment_mb * 2 ** 20),
+            segment_seconds=args.segment_minutes * 60,
+            retention_bytes=int(args.retention_mb * 2 ** 20) if args.retention_mb else None)
+        engines[stream] = AlertEngine(stream, config['fields'], rules)
+    metrics.queue_depth = queued_rows
+
+    stop_event = Event()
+    for stream in STREAMS:
+        Thread(target=follow_stream, args=(stream, args.host, stop_event), daemon=True).start()
+    Thread(target=flush_stores, args=(stop_event,), daemon=True).start()
+
+    try:
+        # Run Flask server on all network interfaces
+        run_server(app, args.port)
+    finally:
+        stop_event.set()
+        for store in stores.values():
+            store.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+import time
+from threading import Thread, Event
+from datetime import datetime
+import numpy as np
+import requests
+from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.devices import device_hosts
+
+# Load variables from .env file
+load_dotenv()
+
+# Route, port, poll interval and recorded columns for every sensor stream
+STREAMS = {
+    'acceleration': {
+        'port': 5003,
+        'route': '/get_acceleration',
+        'interval': 0.1,
+        'fields': ['x', 'y', 'z'],
+    },
+    'orientation': {
+        'port': 5002,
+        'route': '/orientation',
+        'interval': 0.02,
+        'fields': ['pitch', 'roll', 'yaw'],
+    },
+    'tph': {
+        'port': 5001,
+        'route': '/data',
+        'interval': 2.0,
+        'fields': ['temperature', 'humidity', 'pressure'],
+    },
+}
+
+
+def sample_time(stream, data, received):
+    """
+    Returns the acquisition time of a sample as a Unix timestamp
+
+    Args:
+        stream (str): name of the stream the sample belongs to
+        data (dict): decoded JSON response of the server
+        received (float): local time the response arrived
+    """
+    if stream == 'acceleration':
+        return float(data['timestamp'])
+    if stream == 'tph':
+        return datetime.strptime(data['timestamp'], "%Y-%m-%d %H:%M:%S").timestamp()
+    # The orientation server sends no timestamp
+    return received
+
+
+def record_stream(stream, host, stop_event, rows):
+    """
+    Poll one stream until stop_event is set and append rows of
+    (time, field values...) to the rows list
+
+    Args:
+        stream (str): key of STREAMS to record
+        host (str): address of the Raspberry Pi
+        stop_event (Event): set to finish recording
+        rows (list): output list of sample tuples
+    """
+    config = STREAMS[stream]
+    url = f"http://{host}:{config['port']}{config['route']}"
+    session = requests.Session()
+    last_time = None
+    while not stop_event.is_set():
+        started = time.time()
+        try:
+            data = session.get(url, timeout=1).json()
+            t = sample_time(stream, data, time.time())
+            # Slow sensors repeat the same sample between updates
+            if t != last_time or stream == 'orientation':
+                rows.append((t, *(float(data[field]) for field in config['fields'])))
+                last_time = t
+        except Exception as e:
+            print(f"Error recording {stream}: {e}")
+            stop_event.wait(1)
+            continue
+        stop_event.wait(max(0.0, config['interval'] - (time.time() - started)))
+
+
+def save_recording(path, recorded):
+    """
+    Save recorded rows as one compressed .npz file with a column per field.
+    Times are stored as float64 seconds relative to the first sample of the
+    recording, values as float32.
+
+    Args:
+        path (str): output file name
+        recorded (dict): stream name -> list of sample tuples
+    """
+    non_empty = [rows for rows in recorded.values() if rows]
+    origin = min(rows[0][0] for rows in non_empty) if non_empty else 0.0
+    columns = {'origin': np.array(origin, dtype=np.float64)}
+    for stream, rows in recorded.items():
+        table = np.array(rows, dtype=np.float64).reshape(-1, len(STREAMS[stream]['fields']) + 1)
+        # Samples of a stream may arrive out of order after a retry
+        table = table[np.argsort(table[:, 0], kind='stable')]
+        columns[f'{stream}_t'] = table[:, 0] - origin
+        for i, field in enumerate(STREAMS[stream]['fields'], start=1):
+            columns[f'{stream}_{field}'] = table[:, i].astype(np.float32)
+    np.savez_compressed(path, **columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Sense HAT sensor streams to a columnar .npz file")
+    parser.add_argument('output', help="recording file to write, e.g. recording.npz")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds to record (default: 60)")
+    parser.add_argument('--streams', nargs='+', choices=list(STREAMS), default=list(STREAMS),
+                        help="streams to record (default: all)")
+    parser.add_argument('--host', default=(device_hosts() or [None])[0],
+                        help="Raspberry Pi address (default: first address in RASPBERRY_PI_LOCAL_IP)")
+    args = parser.parse_args()
+
+    stop_event = Event()
+    recorded = {stream: [] for stream in args.streams}
+    threads = [Thread(target=record_stream, args=(stream, args.host, stop_event, recorded[stream]), daemon=True)
+               for stream in args.streams]
+    for thread in threads:
+        thread.start()
+
+    try:
+        stop_event.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    save_recording(args.output, recorded)
+    counts = ", ".join(f"{stream}: {len(rows)}" for stream, rows in recorded.items())
+    print(f"Saved {args.output} ({counts})")
+
+
+if __name__ == '__main__':
+    main()
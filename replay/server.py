@@ -0,0 +1,198 @@
+import argparse
+import os
+import time
+import sys
+import logging
+from threading import Thread
+from datetime import datetime
+import numpy as np
+from flask import Flask, jsonify
+from flask_cors import CORS
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.metrics import ServerMetrics, register_metrics
+from common.serving import register_history, register_stream
+
+# Disable all Flask logs
+logging.getLogger('werkzeug').disabled = True
+
+# Recorded columns of every stream, in the order written by recorder.py
+FIELDS = {
+    'acceleration': ['x', 'y', 'z'],
+    'orientation': ['pitch', 'roll', 'yaw'],
+    'tph': ['temperature', 'humidity', 'pressure'],
+}
+
+# Ports of the live servers, so clients only need RASPBERRY_PI_LOCAL_IP changed
+PORTS = {'tph': 5001, 'orientation': 5002, 'acceleration': 5003}
+# Sample route and default /stream interval of every live server
+ROUTES = {
+    'acceleration': ('/get_acceleration', 0.1),
+    'orientation': ('/orientation', 0.01),
+    'tph': ('/data', 2.0),
+}
+
+
+class Replay:
+    """
+    Plays recorded streams back against the wall clock at a given speed.
+    Lookups are a binary search over the time column, so serving a sample
+    costs the same for short and multi-hour recordings.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        recording = np.load(path)
+        self.speed = speed
+        self.loop = loop
+        self.streams = {}
+        for stream, fields in FIELDS.items():
+            if f'{stream}_t' not in recording or len(recording[f'{stream}_t']) == 0:
+                continue
+            self.streams[stream] = {
+                't': recording[f'{stream}_t'],
+                'values': np.column_stack([recording[f'{stream}_{field}'] for field in fields]).astype(np.float64),
+            }
+        self.duration = max((s['t'][-1] for s in self.streams.values()), default=0.0)
+        self.restart()
+
+    def restart(self):
+        self.start_monotonic = time.monotonic()
+
+    def position(self):
+        # Recording time that corresponds to now, plus the number of completed loops
+        elapsed = (time.monotonic() - self.start_monotonic) * self.speed
+        if self.loop and self.duration > 0:
+            laps, elapsed = divmod(elapsed, self.duration)
+            return elapsed, laps
+        return elapsed, 0
+
+    def acquired(self, data, seq):
+        # Monotonic time a sample of the recording stands for, counting loops from the first sample
+        laps, index = np.divmod(seq - 1, len(data['t']))
+        return self.start_monotonic + (data['t'][index] + laps * self.duration) / self.speed
+
+    def sample(self, stream):
+        """
+        Returns the latest (values, seq, acquired) sample of a stream at the
+        current replay position, as a live server's Sampler would. Sequence
+        numbers keep counting across loops, and acquired is the
+        time.monotonic() value the recorded time is played back at.
+        """
+        data = self.streams[stream]
+        elapsed, laps = self.position()
+        index = max(int(np.searchsorted(data['t'], elapsed, side='right')) - 1, 0)
+        seq = int(index + 1 + laps * len(data['t']))
+        return data['values'][index], seq, float(self.acquired(data, seq))
+
+    def since(self, stream, seq, limit):
+        """
+        Returns up to limit already played samples of a stream with a
+        sequence number greater than seq, oldest first, and the oldest
+        sequence number available. The whole recording stays available.
+        """
+        data = self.streams[stream]
+        latest = self.sample(stream)[1]
+        seqs = np.arange(max(seq, 0) + 1, min(max(seq, 0) + limit, latest) + 1)
+        indices = (seqs - 1) % len(data['t'])
+        acquired = self.acquired(data, seqs)
+        return [(data['values'][index], int(s), float(t)) for index, s, t in zip(indices, seqs, acquired)], 1
+
+
+class ReplayStream:
+    """
+    One stream of a Replay with the latest() and since() of the Sampler of
+    a live server, so the shared /stream and /history routes can serve it
+    """
+
+    def __init__(self, replay, stream):
+        self.replay = replay
+        self.stream = stream
+
+    def latest(self):
+        return self.replay.sample(self.stream)
+
+    def since(self, seq, limit):
+        return self.replay.since(self.stream, seq, limit)
+
+
+def wall_time(acquired):
+    # Rebase a monotonic time onto the wall clock, so clients that plot against time.time() keep working
+    return time.time() - (time.monotonic() - acquired)
+
+
+def format_acceleration(values, acquired):
+    x, y, z = values
+    return {'x': float(x), 'y': float(y), 'z': float(z), 'timestamp': wall_time(acquired)}
+
+
+def format_orientation(values, acquired):
+    pitch, roll, yaw = values
+    return {'pitch': round(float(pitch), 3), 'roll': round(float(roll), 3), 'yaw': round(float(yaw), 3)}
+
+
+def format_tph(values, acquired):
+    temp, humidity, pressure = values
+    return {
+        'timestamp': datetime.fromtimestamp(wall_time(acquired)).strftime("%Y-%m-%d %H:%M:%S"),
+        'temperature': round(float(temp), 1),
+        'humidity': round(float(humidity), 1),
+        'pressure': round(float(pressure), 1),
+    }
+
+
+FORMATTERS = {'acceleration': format_acceleration, 'orientation': format_orientation, 'tph': format_tph}
+
+
+def create_app(replay, stream):
+    """
+    Returns a Flask app serving one recorded stream on the routes of its
+    live server: the sample route, /stream, /history and /metrics
+    """
+    app = Flask(__name__)
+    app.logger.disabled = True
+    CORS(app)
+    metrics = ServerMetrics()
+    register_metrics(app, metrics)
+    source = ReplayStream(replay, stream)
+    route, default_interval = ROUTES[stream]
+
+    def format_sample(sample):
+        values, seq, acquired = sample
+        return {**FORMATTERS[stream](values, acquired), **metrics.stamp(seq, acquired)}
+
+    def read_sample():
+        return format_sample(source.latest())
+
+    app.add_url_rule(route, stream, lambda: jsonify(read_sample()))
+    register_stream(app, read_sample, default_interval)
+    register_history(app, source, format_sample)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a recording on the same routes and ports as the live servers")
+    parser.add_argument('recording', help="file written by replay/recorder.py")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed factor (default: 1.0)")
+    parser.add_argument('--loop', action='store_true', help="restart from the beginning when the recording ends")
+    parser.add_argument('--host', default='0.0.0.0', help="interface to listen on (default: 0.0.0.0)")
+    args = parser.parse_args()
+
+    replay = Replay(args.recording, speed=args.speed, loop=args.loop)
+    if not replay.streams:
+        sys.exit(f"{args.recording} contains no samples")
+
+    # One threaded server per live server port, each serving its own stream
+    servers = [make_server(args.host, PORTS[stream], create_app(replay, stream), threaded=True)
+               for stream in replay.streams]
+    for server in servers[1:]:
+        Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Replaying {', '.join(replay.streams)} ({replay.duration:.1f} s) at {args.speed}x")
+    try:
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
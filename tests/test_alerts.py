@@ -0,0 +1,128 @@
+import math
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.alerts import DERIVED_FIELDS, AlertEngine
+
+RISING = {'name': 'temperature-rising', 'stream': 'tph', 'field': 'temperature', 'kind': 'rate', 'window': 60,
+          'above': 0.05, 'clear': 0.02}
+
+
+def feed(engine, t, temperature):
+    return engine.process(np.asarray(t, dtype=float), {'temperature': np.asarray(temperature, dtype=float)})
+
+
+def test_rate_waits_for_window():
+    # One 0.1 °C rounding step at start-up must not read as 0.1 °C/s
+    engine = AlertEngine('tph', ['temperature'], [RISING])
+    assert feed(engine, [0], [25.0]) == []
+    assert feed(engine, [1], [25.1]) == []
+    assert feed(engine, np.arange(2, 61), np.full(59, 25.1)) == []
+
+
+def test_rate_raises_once_window_filled():
+    engine = AlertEngine('tph', ['temperature'], [RISING])
+    t = np.arange(0, 120)
+    events = feed(engine, t, 25.0 + 0.1 * t)
+    assert [event['state'] for event in events] == ['raised']
+    assert events[0]['t'] == 60
+
+
+def reference_events(rules, t, values):
+    """
+    Evaluate rules one sample and one rule at a time, the way the engine's
+    array code is meant to behave; returns (sample, rule, raised, value)
+    """
+    state = {rule['name']: {'condition': False, 'since': None, 'active': False} for rule in rules}
+    events = []
+    for i in range(len(t)):
+        for rule in rules:
+            field = rule['field']
+            if field in DERIVED_FIELDS:
+                inputs, derive = DERIVED_FIELDS[field]
+                series = derive(*(values[name] for name in inputs))
+            else:
+                series = values[field]
+            window = rule.get('window', 0)
+            if rule['kind'] == 'threshold':
+                value = series[i]
+            elif rule['kind'] == 'rate':
+                j = next(k for k in range(i + 1) if t[k] >= t[i] - window) if window > 0 else max(i - 1, 0)
+                filled = t[i] - t[0] >= window
+                value = (series[i] - series[j]) / (t[i] - t[j]) if t[i] > t[j] and filled else math.nan
+            else:
+                inside = [series[k] for k in range(i + 1) if t[k] > t[i] - window]
+                value = {'mean': np.mean, 'std': np.std, 'min': min, 'max': max,
+                         'range': lambda v: max(v) - min(v)}[rule['aggregate']](inside)
+
+            sign = 1 if 'above' in rule else -1
+            limit = rule.get('above', rule.get('below'))
+            current = state[rule['name']]
+            # NaN compares false both ways and keeps the state
+            if sign * value > sign * limit:
+                condition = True
+            elif sign * value < sign * rule.get('clear', limit):
+                condition = False
+            else:
+                condition = current['condition']
+            if condition and not current['condition']:
+                current['since'] = t[i]
+            current['condition'] = condition
+            active = condition and t[i] - current['since'] >= rule.get('for', 0)
+            if active != current['active']:
+                events.append((i, rule['name'], active, value))
+            current['active'] = active
+    return events
+
+
+def random_rules(rng, count):
+    rules = []
+    for index in range(count):
+        kind = rng.choice(['threshold', 'rate', 'aggregate'])
+        rule = {'name': f'rule{index}', 'stream': 'acceleration', 'field': rng.choice(['x', 'y', 'z', 'pga']),
+                'kind': kind}
+        if kind == 'rate':
+            rule['window'] = rng.choice([0, 0.05, 0.2, 0.5])
+        elif kind == 'aggregate':
+            rule['window'] = rng.choice([0.05, 0.2, 0.5])
+            rule['aggregate'] = rng.choice(['mean', 'std', 'min', 'max', 'range'])
+        limit = rng.uniform(-0.2, 0.3)
+        if rng.random() < 0.5:
+            rule['above'], rule['clear'] = limit, limit - rng.uniform(0, 0.1)
+        else:
+            rule['below'], rule['clear'] = limit, limit + rng.uniform(0, 0.1)
+        if rng.random() < 0.5:
+            rule['for'] = rng.choice([0.02, 0.1])
+        rules.append(rule)
+    return rules
+
+
+def test_matches_per_sample_reference():
+    fields = ['x', 'y', 'z']
+    for seed in range(3):
+        rng = random.Random(seed)
+        noise = np.random.default_rng(seed)
+        rules = random_rules(rng, 40)
+        t = np.cumsum(noise.uniform(0.005, 0.03, 400))
+        values = {field: noise.normal(0, 0.1, len(t)) for field in fields}
+        values['z'] += 0.978
+        expected = reference_events(rules, t, values)
+
+        # Random batch sizes, so windows, hysteresis and debounce carry across batches
+        engine = AlertEngine('acceleration', fields, rules)
+        events = []
+        start = 0
+        while start < len(t):
+            end = start + rng.randint(1, 30)
+            for event in engine.process(t[start:end], {field: values[field][start:end] for field in fields}):
+                events.append((int(np.searchsorted(t, event['t'])), event['rule'], event['state'] == 'raised',
+                               event['value']))
+            start = end
+
+        assert expected, "the random rules should raise some alerts"
+        assert [event[:3] for event in events] == [event[:3] for event in expected]
+        np.testing.assert_allclose([event[3] for event in events], [event[3] for event in expected], atol=1e-9)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.colstore import ColumnStore
+from common.export import RESAMPLE_METHODS, export, iter_database, iter_store, read_binary, resample
+
+FIELDS = ['x', 'y', 'z']
+START = 1714521600.0
+
+
+def write_store(root, rows=1000, interval=0.02):
+    # Small segments, so reads cross segment files as well as chunks
+    store = ColumnStore(root, 'acceleration', FIELDS, segment_bytes=4096, chunk_rows=64)
+    rng = np.random.default_rng(0)
+    t = START + np.arange(rows) * interval
+    values = rng.normal(0, 0.1, (rows, len(FIELDS))).astype(np.float32)
+    for i in range(rows):
+        store.append(t[i], i + 1, values[i])
+    store.flush()
+    return t, values
+
+
+def read_export(path):
+    # Returns {column: array} of an exported file in any format
+    if path.endswith('.csv'):
+        table = np.genfromtxt(path, delimiter=',', names=True)
+    elif path.endswith('.npz'):
+        with np.load(path) as archive:
+            return {name: archive[name] for name in archive.files}
+    elif path.endswith('.bin'):
+        table = read_binary(path)
+    else:
+        table = np.load(path)
+    return {name: table[name] for name in table.dtype.names}
+
+
+def test_formats_round_trip(tmp_path):
+    root = str(tmp_path / 'store')
+    t, values = write_store(root)
+    for extension in ('.csv', '.npy', '.npz', '.bin'):
+        path = str(tmp_path / f'export{extension}')
+        rows = export(iter_store(root, 'acceleration', START + 2.0, START + 18.0, chunk_rows=97), path)
+        selected = (t >= START + 2.0) & (t < START + 18.0)
+        assert rows == selected.sum()
+
+        columns = read_export(path)
+        assert list(columns) == ['t', 'seq', *FIELDS]
+        # CSV keeps milliseconds and 7 significant digits, the binary formats are exact
+        exact = extension != '.csv'
+        np.testing.assert_allclose(columns['t'], t[selected], rtol=0, atol=0 if exact else 5e-4)
+        np.testing.assert_array_equal(columns['seq'], np.flatnonzero(selected) + 1)
+        for i, field in enumerate(FIELDS):
+            np.testing.assert_allclose(columns[field], values[selected, i], rtol=0 if exact else 1e-6,
+                                       atol=0 if exact else 1e-8)
+
+
+def test_empty_range_exports_header_only(tmp_path):
+    root = str(tmp_path / 'store')
+    write_store(root, rows=10)
+    path = str(tmp_path / 'empty.npy')
+    assert export(iter_store(root, 'acceleration', START + 100.0), path) == 0
+    assert np.load(path).dtype.names == ('t', 'seq', *FIELDS)
+
+
+def test_resample_across_chunk_boundaries(tmp_path):
+    root = str(tmp_path / 'store')
+    t, values = write_store(root)
+    interval = 0.3
+    bins = np.floor(t / interval)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], len(t)]
+    expected = {
+        'mean': lambda column: np.add.reduceat(column.astype(np.float64), starts) / (ends - starts),
+        'min': lambda column: np.minimum.reduceat(column, starts),
+        'max': lambda column: np.maximum.reduceat(column, starts),
+        'first': lambda column: column[starts],
+        'last': lambda column: column[ends - 1],
+    }
+    for how in RESAMPLE_METHODS:
+        # Chunks of 7 rows split most 15-row bins, some of them twice
+        chunks = list(resample(iter_store(root, 'acceleration', chunk_rows=7), interval, how))
+        result = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+        assert list(result) == ['t', *FIELDS]
+        np.testing.assert_allclose(result['t'], bins[starts] * interval)
+        for i, field in enumerate(FIELDS):
+            np.testing.assert_allclose(result[field], expected[how](values[:, i]), rtol=1e-6, atol=1e-7)
+
+
+def test_database_without_device_column(tmp_path):
+    # Databases of the TPH client before it monitored several devices
+    path = str(tmp_path / 'environment_data.db')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE readings (timestamp TEXT, temperature REAL, humidity REAL, pressure REAL)")
+    db.executemany("INSERT INTO readings VALUES (?,?,?,?)",
+                   [(f'2024-05-01 12:00:0{i}', 20.0 + i, 50.0, 1000.0) for i in range(5)])
+    db.commit()
+    db.close()
+
+    chunks = list(iter_database(path, fields=['temperature'], chunk_rows=2))
+    assert [len(chunk['t']) for chunk in chunks] == [2, 2, 1]
+    temperature = np.concatenate([chunk['temperature'] for chunk in chunks])
+    np.testing.assert_array_equal(temperature, [20, 21, 22, 23, 24])
+    t = np.concatenate([chunk['t'] for chunk in chunks])
+    np.testing.assert_array_equal(np.diff(t), 1.0)
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.shm_ring import SharedRing
+
+
+def test_count_includes_rows_beyond_capacity():
+    ring = SharedRing.create(['t', 'x'], 4)
+    try:
+        ring.append(np.column_stack([np.arange(10), np.arange(10)]))
+        assert ring.count == 10
+        assert ring.latest(4)[:, 0].tolist() == [6, 7, 8, 9]
+        rows, count = ring.since(8)
+        assert rows[:, 0].tolist() == [8, 9] and count == 10
+    finally:
+        ring.close()
+
+
+def test_since_drops_rows_being_overwritten():
+    ring = SharedRing.create(['t'], 4)
+    try:
+        ring.append(np.arange(6.0)[:, None])
+        # A writer announced two rows and is overwriting the slots of rows 2 and 3
+        ring.header[3] = 8
+        rows, count = ring.since(2)
+        assert rows[:, 0].tolist() == [4, 5] and count == 6
+    finally:
+        ring.close()